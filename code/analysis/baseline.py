@@ -11,6 +11,7 @@ import agent
 import network 
 import parameters
 import spread
+import store
 
 def obtain_metrics(model):
     """
@@ -51,25 +52,33 @@ def obtain_metrics(model):
     
     return metrics  
 
-def run_simulation(pop_size, horizon):
+def run_simulation(pop_size, horizon, engine = 'loop', seed = None, snapshots = None, bundles = None):
     '''
     FUNCTION TO RUN A SIMULATION REPEAT
 
     PARAMS: 
     pop_size: number of agents [int]
     horizon: years to simulate for [int]
+    engine: influence engine, 'loop' or 'matrix' [str]
+    seed: seed for generating the agents when using snapshots [int]
+    snapshots: folder of cached populations, or None to generate them (see store.py) [str]
+    bundles: folder of compiled parameter bundles, or None to keep them in memory (see parameters.load_parameters) [str]
 
     OUTPUT: 
     model: model class [class]
     '''
 
-    # Generate agents
-    sim_params = parameters.Parameters('scenarios_21')
-    sim_network = network.Network(sim_params)
-    sim_agents = sim_network.generate_agents(pop_size)
+    # Generate agents (or load them from the snapshot cache)
+    sim_params = parameters.load_parameters('scenarios_21', bundles)
+    if snapshots is None:
+        sim_network = network.Network(sim_params)
+        sim_agents = sim_network.generate_agents(pop_size)
+    else:
+        sim_agents = store.cached_agents(sim_params, pop_size, seed, snapshots)
 
     # Run model
-    model = spread.Spread_Model(sim_agents, sim_params.get_inf_by_rel(), 'archbold_test_results')
+    model = spread.Spread_Model(sim_agents, sim_params.get_inf_by_rel(), 'archbold_test_results', engine = engine,
+                               cvd_table = sim_params.cvd_table)
     sim_run = model.simulation(horizon)
 
     return model
@@ -113,10 +122,13 @@ def print_simulation_metrics(ic_m, ic_f, py_m, py_f, rate_m, rate_f):
 N = 10 # no. of simulation repeats
 POP_SIZE = 350000 # population size
 HORIZON = 10 # years to simulate
+ENGINE = 'loop' # influence engine ('loop' or 'matrix')
+SNAPSHOTS = None # folder of cached populations (e.g. 'snapshots'), or None to generate every population
+BUNDLES = None # folder of compiled parameter bundles (e.g. 'bundles'), or None to read the parameter files in every run
 
 random.seed(0) # set seed for reproducibility
 
-metrics = obtain_metrics(run_simulation(POP_SIZE, HORIZON)) # run sim.
+metrics = obtain_metrics(run_simulation(POP_SIZE, HORIZON, ENGINE, 0, SNAPSHOTS, BUNDLES)) # run sim.
 
 storage = {'cases_m': metrics[0], 'cases_f': metrics[1], 'years_m': metrics[2],
     'years_f': metrics[3], 'rate_m': metrics[4], 'rate_f': metrics[5]} # store metrics
@@ -126,7 +138,7 @@ names = ['cases_m', 'cases_f', 'years_m', 'years_f', 'rate_m', 'rate_f']
 for i in range(1,N): # for each repeat
 
     random.seed(i) # random seed
-    metrics = obtain_metrics(run_simulation(POP_SIZE, HORIZON))
+    metrics = obtain_metrics(run_simulation(POP_SIZE, HORIZON, ENGINE, i, SNAPSHOTS, BUNDLES))
 
     for j in range(len(names)): # for each metric
         storage[names[j]] = np.vstack((storage[names[j]], metrics[j]))
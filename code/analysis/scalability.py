@@ -11,6 +11,8 @@ import agent
 import network 
 import parameters
 import spread
+import store
+import chunked
 
 def obtain_incident_rates(model):
     '''
@@ -30,36 +32,102 @@ def obtain_incident_rates(model):
 
     return rates
 
-random.seed(0)
-
-pop_sizes = np.append([3.5], range(2,13)) * 100000
-
-incident_rates = {}
-
-for N in pop_sizes:
-
-    mod = run_simulation(N, 10)
-    incident_rates[N] = obtain_incident_rates(mod)
-
-    print('Iteration {}K complete'.format(N/1000))
-
-male_ir = []
-female_ir = []
-for i in pop_sizes:
-    male_ir.append(incident_rates[i]['Male'])
-    female_ir.append(incident_rates[i]['Female'])
-
-male_ir.insert(2, male_ir.pop(0))
-print(male_ir)
-female_ir.insert(2, female_ir.pop(0))
-print(female_ir)
-x = list(pop_sizes)
-x.insert(2, x.pop(0))
-y = np.array(x)
+def run_simulation(pop_size, horizon, engine = 'loop', seed = None, snapshots = None, store_folder = None, shards = None, grow = False, ordering = None, bundles = None):
+    '''
+    FUNCTION TO RUN A SIMULATION REPEAT
+
+    PARAMS: 
+    pop_size: number of agents [int]
+    horizon: years to simulate for [int]
+    engine: influence engine, 'loop' or 'matrix' [str]
+    seed: seed for generating the agents when using snapshots [int]
+    snapshots: folder of cached populations, or None to generate them (see store.py) [str]
+    store_folder: folder to generate the population into as a memory-mapped store and run the chunked
+        model on (see chunked.py), or None to keep the agents in memory [str]
+    shards: number of shards to generate the store's households in parallel, from seed [int]
+    grow: grow the population generated for the previous (smaller) size rather than generating a new one,
+        from seed and with shards; requires store_folder (see store.grow_store) [bool]
+    ordering: cache-locality ordering of the agents for the matrix engine or the store (see network.ORDERINGS),
+        or None to keep the generated order [str]
+    bundles: folder of compiled parameter bundles, or None to keep them in memory (see parameters.load_parameters) [str]
+
+    OUTPUT: 
+    model: model class [class]
+    '''
 
-plt.plot(y/1000, female_ir, ':o', label = "Women", color = 'orange')
-plt.plot(y/1000, male_ir, '--+', label = "Men", color = 'teal')
-plt.legend()
-plt.xlabel('Population size (1000s)')
-plt.ylabel('Mean Incident Rate')
-plt.show()
\ No newline at end of file
+    if grow and store_folder is None:
+        print("Error: growing the population requires a store_folder")
+        exit(1)
+
+    # Generate agents (or load them from the snapshot cache, or generate them straight into a store)
+    sim_params = parameters.load_parameters('scenarios_21', bundles)
+    if store_folder is not None:
+        # the population is kept unsimulated (so that it can be grown) and the simulation runs on a copy
+        population = store_folder + '_population'
+        if grow:
+            store.grow_store(sim_params, population, pop_size, shards = shards, seed = seed)
+        else:
+            store.generate_store(sim_params, population, pop_size, shards = shards, seed = seed)
+        store.copy_store(population, store_folder)
+        if ordering is not None:
+            store.reorder_store(store_folder, ordering)
+    elif snapshots is None:
+        sim_network = network.Network(sim_params)
+        sim_agents = sim_network.generate_agents(pop_size)
+    else:
+        sim_agents = store.cached_agents(sim_params, pop_size, seed, snapshots)
+
+    # Run model
+    if store_folder is None:
+        model = spread.Spread_Model(sim_agents, sim_params.get_inf_by_rel(), 'archbold_test_results', engine = engine,
+                                   cvd_table = sim_params.cvd_table, ordering = ordering)
+    else:
+        model = chunked.Spread_Model(store_folder, sim_params.get_inf_by_rel(), 'archbold_test_results', sim_params.cvd_table)
+    model.simulation(horizon)
+
+    return model
+
+ENGINE = 'loop' # influence engine ('loop' or 'matrix')
+SNAPSHOTS = None # folder of cached populations (e.g. 'snapshots'), or None to generate every population
+STORE = None # folder for a memory-mapped store run by the chunked model (e.g. 'store'), or None to use ENGINE
+SHARDS = None # number of parallel shards generating each store (e.g. os.cpu_count()), or None for one process
+GROW = False # with STORE, grow one population through the sizes in increasing order instead of generating each
+ORDERING = None # with STORE or the matrix engine, reorder the agents for cache locality (e.g. 'rcm'), or None
+BUNDLES = None # folder of compiled parameter bundles (e.g. 'bundles'), or None to read the parameter files in every run
+
+# the sweep only runs as a script, as the SHARDS worker processes may import this module (with the spawn or
+# forkserver start methods)
+if __name__ == '__main__':
+
+    random.seed(0)
+    pop_sizes = np.append([3.5], range(2,13)) * 100000
+
+    incident_rates = {}
+
+    for i, N in enumerate(sorted(pop_sizes) if GROW else pop_sizes):
+
+        mod = run_simulation(int(N), 10, ENGINE, i, SNAPSHOTS, STORE, SHARDS, GROW and i > 0, ORDERING, BUNDLES)
+        incident_rates[N] = obtain_incident_rates(mod)
+
+        print('Iteration {}K complete'.format(N/1000))
+
+    male_ir = []
+    female_ir = []
+    for i in pop_sizes:
+        male_ir.append(incident_rates[i]['Male'])
+        female_ir.append(incident_rates[i]['Female'])
+
+    male_ir.insert(2, male_ir.pop(0))
+    print(male_ir)
+    female_ir.insert(2, female_ir.pop(0))
+    print(female_ir)
+    x = list(pop_sizes)
+    x.insert(2, x.pop(0))
+    y = np.array(x)
+
+    plt.plot(y/1000, female_ir, ':o', label = "Women", color = 'orange')
+    plt.plot(y/1000, male_ir, '--+', label = "Men", color = 'teal')
+    plt.legend()
+    plt.xlabel('Population size (1000s)')
+    plt.ylabel('Mean Incident Rate')
+    plt.show()
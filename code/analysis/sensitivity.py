@@ -11,54 +11,48 @@ import agent
 import network 
 import parameters
 import spread
+import store
 
-def change_inf(level, risk = None, all_factors = True, pop_size = 350000):
+def change_inf(sim_params, level, risk = None, all_factors = True, pop_size = 350000, seed = None, snapshots = None):
     '''
     FUNCTION TO OBTAIN INFLUENCE LEVELS ASSOCIATED WITH TABLE 5
 
     PARAMS:
+    - sim_params: parameters shared by every scenario, which are not changed [Parameters]
     - level: level 0 or 2? [int]
     - risk: risk factor to minimise/maximise [str]
     - all_factors: minimise/maximise all factors? [bool]
     - pop_size: number of agents [int]
+    - seed: seed for generating the agents when using snapshots [int]
+    - snapshots: folder of cached populations, or None to generate them (see store.py) [str]
 
     RETURNS:
-    - list of agent list and influence dictionary [list]
+    - list of agent list and influence array [list]
     '''
 
-    # Generate agents
-    sim_params = parameters.Parameters('scenarios_21')
-    sim_network = network.Network(sim_params)
-    sim_agents = sim_network.generate_agents(pop_size)
+    # Generate agents (or load them from the snapshot cache)
+    if snapshots is None:
+        sim_network = network.Network(sim_params)
+        sim_agents = sim_network.generate_agents(pop_size)
+    else:
+        sim_agents = store.cached_agents(sim_params, pop_size, seed, snapshots)
 
-    # Alter default influence dictionary
-    influences = sim_params.get_inf_by_rel()
-    relationships = ['Spouse', 'Household', 'Friendship', 'Workplace']
+    # Override the default influence at the level, for every relationship and workplace type
+    influences = sim_params.influence_overlay()
     if all_factors == True:
-        for i in relationships:
-            if i!='Workplace':
-                influences[i]['Inactivity'][level] = 1
-                influences[i]['Diet'][level] = 1
-                influences[i]['Smoking'][level] = 1
-                influences[i]['Alcohol'][level] = 1
-            else:
-                for j in range(1,5):
-                    influences[i][j]['Inactivity'][level] = 1
-                    influences[i][j]['Diet'][level] = 1
-                    influences[i][j]['Smoking'][level] = 1
-                    influences[i][j]['Alcohol'][level] = 1
+        influences = influences.set(1, levels = [level])
     else:
-        for i in relationships:
-            if i!='Workplace':
-                influences[i][risk][level] = 1
-            else: 
-                for j in range(1,5):
-                    influences[i][j][risk][level] = 1
+        influences = influences.set(1, behaviours = [risk], levels = [level])
 
-    return sim_agents, influences
+    return sim_agents, influences.resolve()
 
 # Set-up
 random.seed(0)
+ENGINE = 'loop' # influence engine ('loop' or 'matrix')
+SNAPSHOTS = None # folder of cached populations (e.g. 'snapshots'), or None to generate every population
+BUNDLES = None # folder of compiled parameter bundles (e.g. 'bundles'), or None to read the parameter files in every run
+run = 0 # simulation number, used as the seed of cached populations
+sim_params = parameters.load_parameters('scenarios_21', BUNDLES)
 levels = [0,2]
 labels = ['Level 0', 'Level 2']
 risk_factors = ['Inactivity', 'Diet', 'Smoking', 'Alcohol']
@@ -84,16 +78,20 @@ for level in levels:
 
     for risk in risk_factors:
 
-        inputs = change_inf(level = level, risk = risk, all_factors = False)
-        model = spread.Spread_Model(inputs[0], inputs[1], 'archbold_test_results')
+        inputs = change_inf(sim_params, level = level, risk = risk, all_factors = False, seed = run, snapshots = SNAPSHOTS)
+        run = run + 1
+        model = spread.Spread_Model(inputs[0], inputs[1], 'archbold_test_results', engine = ENGINE,
+                                    cvd_table = sim_params.cvd_table)
         model.simulation(10)
         rates[level][risk]['M'] = round(sum(model.cvd_count['M'].values())/
                                    (sum(model.person_years['M'].values())/1000), 4)
         rates[level][risk]['F'] = round(sum(model.cvd_count['F'].values())/
                                    (sum(model.person_years['F'].values())/1000), 4)
 
-    inputs = change_inf(level = level)
-    model = spread.Spread_Model(inputs[0], inputs[1], 'archbold_test_results')
+    inputs = change_inf(sim_params, level = level, seed = run, snapshots = SNAPSHOTS)
+    run = run + 1
+    model = spread.Spread_Model(inputs[0], inputs[1], 'archbold_test_results', engine = ENGINE,
+                                cvd_table = sim_params.cvd_table)
     model.simulation(10)
     rates[level]['All']['M'] = round(sum(model.cvd_count['M'].values())/
                                    (sum(model.person_years['M'].values())/1000), 4)
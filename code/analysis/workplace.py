@@ -11,6 +11,7 @@ import agent
 import network 
 import parameters
 import intervention
+import store
 
 def assign_intervention(agents, adoption):
     '''
@@ -56,36 +57,21 @@ def get_intervention_inf(influences, risk):
 
     PARAMS
     ------
-    influences: influences for all relationships/interventions [dict]
+    influences: overlay on the influences for all relationships (see parameters.InfluenceOverlay) [InfluenceOverlay]
     risk: risk factor(s) to change Diet/Inactivity/Both [str]
 
     OUTPUT
     ------
-    dict: dictionary of influences 
+    InfluenceOverlay: overlay with the changed influences (influences itself is unchanged)
     '''
 
-    if risk == 'Diet':
+    behaviours = {'Diet': ['Diet'], 'Inactivity': ['Inactivity'], 'Both': ['Diet', 'Inactivity']}.get(risk, [])
 
-        for i in range(1,5):
+    for behaviour in behaviours:
+        for level in [0, 1]:
             # Set workplace influence to half the friendship influence
-            influences['Workplace'][i]['Diet'][0] = 0.5 * influences['Friendship']['Diet'][0]
-            influences['Workplace'][i]['Diet'][1] = 0.5 * influences['Friendship']['Diet'][1]
-
-    if risk == 'Inactivity':
-
-        for i in range(1,5):
-            # Set workplace influence to half the friendship influence
-            influences['Workplace'][i]['Inactivity'][0] = 0.5 * influences['Friendship']['Inactivity'][0]
-            influences['Workplace'][i]['Inactivity'][1] = 0.5 * influences['Friendship']['Inactivity'][1]
-
-    if risk == 'Both': 
-
-        for i in range(1,5): 
-            # Set workplace influence to half the friendship influence
-            influences['Workplace'][i]['Diet'][0] = 0.5 * influences['Friendship']['Diet'][0]
-            influences['Workplace'][i]['Diet'][1] = 0.5 * influences['Friendship']['Diet'][1]
-            influences['Workplace'][i]['Inactivity'][0] = 0.5 * influences['Friendship']['Inactivity'][0]
-            influences['Workplace'][i]['Inactivity'][1] = 0.5 * influences['Friendship']['Inactivity'][1]
+            influences = influences.set(0.5 * influences.get('Friendship', behaviour, level), relationships = ['Workplace'],
+                                        behaviours = [behaviour], levels = [level], workplace_types = range(1,5))
 
     return influences
 
@@ -119,18 +105,31 @@ risk_factors = ['Diet', 'Inactivity', 'Both']
 N = 350000
 horizon = 10
 params = 'scenarios_21' # change to scenarios_4 for mean workplace size of 4
+ENGINE = 'loop' # influence engine ('loop' or 'matrix')
+SNAPSHOTS = None # folder of cached populations (e.g. 'snapshots'), or None to generate every population
+BUNDLES = None # folder of compiled parameter bundles (e.g. 'bundles'), or None to read the parameter files in every run
+SHARED_INFLUENCE = True # as in the original code (and the blog's reproduced table 6), agents outside the intervention also
+                        # take the intervention influences, so the adoption rate has no effect; False gives them the
+                        # unchanged influences
+run = 0 # simulation number, used as the seed of cached populations
+sim_params = parameters.load_parameters(params, BUNDLES) # shared by every scenario, whose influences are overlays on it
 
 for adoption in adoption_rates:
     number = 0
         
     for risk in risk_factors:
 
-        sim_params = parameters.Parameters(params)
-        sim_network = network.Network(sim_params)
-        sim_agents = sim_network.generate_agents(N)
+        if SNAPSHOTS is None:
+            sim_network = network.Network(sim_params)
+            sim_agents = sim_network.generate_agents(N)
+        else:
+            sim_agents = store.cached_agents(sim_params, N, run, SNAPSHOTS)
+        run = run + 1
         assign_intervention(sim_agents, adoption)
-        intervention_inf = get_intervention_inf(sim_params.get_inf_by_rel(), risk = risk)
-        model = intervention.Spread_Model(sim_agents, sim_params.get_inf_by_rel(), intervention_inf, 'archbold_test_results')
+        intervention_inf = get_intervention_inf(sim_params.influence_overlay(), risk = risk).resolve()
+        baseline_inf = intervention_inf if SHARED_INFLUENCE else sim_params.get_influence()
+        model = intervention.Spread_Model(sim_agents, baseline_inf, intervention_inf, 'archbold_test_results',
+                                          engine = ENGINE, cvd_table = sim_params.cvd_table)
         model.simulation(horizon)
         rates[risk][adoption]['M'] = round(sum(model.cvd_count['M'].values())/
                                      (sum(model.person_years['M'].values())/1000), 4)
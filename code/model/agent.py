@@ -4,15 +4,145 @@
 
 import random
 import math
+import numpy as np
+
+# default QRISK3 covariates (bmi, cholesterol ratio, systolic blood pressure and its standard deviation) by sex
+QRISK3_DEFAULTS = {
+	'M': {'bmi': 27.7, 'rati': 4.1, 'sbp': 130, 'sbps5': 7},
+	'F': {'bmi': 26.8, 'rati': 3.5, 'sbp': 123, 'sbps5': 5},
+}
+
+
+# the QRISK3 functions accept scalars or NumPy arrays; scalars use the (faster) math module
+def array_module(*values):
+	if any(isinstance(v, np.ndarray) for v in values):
+		return np
+	return math
+
+
+# Calculate the ten-year base CVD chance for a female, based on age, bmi, cholesterol and blood pressure.
+# code adapted from algorithm provided by the QRISK3 team: https://www.qrisk.org
+# see paper: Development and validation of QRISK3 risk prediction algorithms to estimate future risk of cardiovascular disease: prospective cohort study, BMJ 2017;357:j2099
+def qrisk3_female(age, bmi = 26.8, rati = 3.5, sbp = 123, sbps5 = 5):
+	xp = array_module(age, bmi, rati, sbp, sbps5)
+	dage = age/10.0
+	age_1 = dage ** -2
+	age_2 = dage
+	dbmi = bmi/10.0
+	bmi_1 = dbmi ** -2
+	bmi_2 = dbmi ** -2 * xp.log(dbmi)
+
+	# Centring the continuous variables
+	age_1 = age_1 - 0.053274843841791
+	age_2 = age_2 - 4.332503318786621
+	bmi_1 = bmi_1 - 0.154946178197861
+	bmi_2 = bmi_2 - 0.144462317228317
+	rati = rati - 3.476326465606690
+	sbp = sbp - 123.130012512207030
+	sbps5 = sbps5 - 9.002537727355957
+
+	# Start of Sum
+	a = 0
+
+	# Sum from continuous values
+	a += age_1 * -8.1388109247726188000000000
+	a += age_2 * 0.7973337668969909800000000
+	a += bmi_1 * 0.2923609227546005200000000
+	a += bmi_2 * -4.1513300213837665000000000
+	a += rati * 0.1533803582080255400000000
+	a += sbp * 0.0131314884071034240000000
+	a += sbps5 * 0.0078894541014586095000000
+
+	# Sum from interaction terms
+	a += age_1 * bmi_1 * 23.8026234121417420000000000
+	a += age_1 * bmi_2 * -71.1849476920870070000000000
+	a += age_1 * sbp * 0.0341318423386154850000000
+	a += age_2 * bmi_1 * 0.5236995893366442900000000
+	a += age_2 * bmi_2 * 0.0457441901223237590000000
+	a += age_2 * sbp * -0.0015082501423272358000000
+
+	# Calculate the score itself
+	score = 100.0 * (1 - 0.988876402378082 ** xp.exp(a))
+	return score / 100.0
+
+
+# Calculate the ten-year base CVD chance for a male, based on age, bmi, cholesterol and blood pressure.
+# code adapted from algorithm provided by the QRISK3 team: https://www.qrisk.org
+# see paper: Development and validation of QRISK3 risk prediction algorithms to estimate future risk of cardiovascular disease: prospective cohort study, BMJ 2017;357:j2099
+def qrisk3_male(age, bmi = 27.7, rati = 4.1, sbp = 130, sbps5 = 7):
+	xp = array_module(age, bmi, rati, sbp, sbps5)
+	dage=age/10.0
+	age_1 = dage ** -1
+	age_2 = dage ** 3
+	dbmi=bmi/10.0
+	bmi_2 = dbmi ** -2 * xp.log(dbmi)
+	bmi_1 = dbmi ** -2
+
+	# Centring the continuous variables
+	age_1 = age_1 - 0.234766781330109
+	age_2 = age_2 - 77.284080505371094
+	bmi_1 = bmi_1 - 0.149176135659218
+	bmi_2 = bmi_2 - 0.141913309693336
+	rati = rati - 4.300998687744141
+	sbp = sbp - 128.571578979492190
+	sbps5 = sbps5 - 8.756621360778809
+
+	# Start of Sum
+	a=0
+
+	# Sum from continuous values
+	a += age_1 * -17.8397816660055750000000000;
+	a += age_2 * 0.0022964880605765492000000;
+	a += bmi_1 * 2.4562776660536358000000000;
+	a += bmi_2 * -8.3011122314711354000000000;
+	a += rati * 0.1734019685632711100000000;
+	a += sbp * 0.0129101265425533050000000;
+	a += sbps5 * 0.0102519142912904560000000;
+
+	# Sum from interaction terms
+	a += age_1 * bmi_1 * 31.0049529560338860000000000
+	a += age_1 * bmi_2 * -111.2915718439164300000000000
+	a += age_1 * sbp * 0.0188585244698658530000000
+	a += age_2 * bmi_1 * 0.0050380102356322029000000;
+	a += age_2 * bmi_2 * -0.0130744830025243190000000;
+	a += age_2 * sbp * -0.0000127187419158845700000;
+
+	# Calculate the score itself
+	score = 100.0 * (1 - 0.977268040180206 ** xp.exp(a))
+	return score / 100.0
+
+
+# Calculate the ten-year base CVD chance for a whole population in one call.
+# sex (0 = male, 1 = female, see SEX_INDEX) and age are arrays, and bmi, rati, sbp and sbps5
+# are optional per-agent covariate arrays; missing arrays, and NaN entries, use the
+# defaults for the agent's sex (QRISK3_DEFAULTS).
+def qrisk3(sex, age, bmi = None, rati = None, sbp = None, sbps5 = None):
+	covariates = {'bmi': bmi, 'rati': rati, 'sbp': sbp, 'sbps5': sbps5}
+	chance = np.empty(len(age))
+	for s, sex_str in enumerate(['M', 'F']):
+		rows = sex == s
+		values = dict()
+		for name, value in covariates.items():
+			default = QRISK3_DEFAULTS[sex_str][name]
+			if value is None:
+				values[name] = np.full(rows.sum(), float(default))
+			else:
+				values[name] = np.where(np.isnan(value[rows]), default, value[rows])
+		qrisk3_sex = qrisk3_male if sex_str == 'M' else qrisk3_female
+		chance[rows] = qrisk3_sex(age[rows].astype(np.float64), **values)
+	return chance
+
 
 class Agent:
-	id_counter = 0
+	def __init__(self, sex, age, risk_factors, initial_levels, agent_id):
 
-	def __init__(self, sex, age, risk_factors, initial_levels):
+		# ID of the agent within its population, allocated by the population (e.g. Network.generate_agents)
+		# as its position in the agent list, so IDs are dense from 0 and index per-agent arrays directly
+		self.id = agent_id
 
-		#unique ID for agent
-		self.id = type(self).id_counter
-		type(self).id_counter += 1
+		# dead agents are kept (as tombstones) in other agents' relationship lists until the
+		# simulation compacts them, so influence is only taken from agents that are alive
+		self.alive = True
 
 		# initialising spouse as 'None' for single
 		# NB the spouse relationship dominates other forms, and so a spouse not included in household etc. 
@@ -23,12 +153,16 @@ class Agent:
 		# such that household > friends > workplace
 		self.household = []
 		self.friends = []
+		# household the agent lives in (every member shares the id), set when the household is created
+		self.household_id = None
 
 		# workplace is a list of (influential) work colleagues
 		# initialise to empty
 		self.assign_to_workplace = None
 		self.workplace = []
 		self.workplace_type = None
+		# workplace the agent works in (every employee shares the id), None without a workplace
+		self.workplace_id = None
 
 		# setting initial values for key attributes
 		self.age = age
@@ -99,96 +233,14 @@ class Agent:
 		self.threshold = random.gauss(1, 0.05)
 
 
-	# Calculate the base CVD chance for a female, based on age, bmi, cholesterol and blood pressure.
-	# code adapted from algorithm provided by the QRISK3 team: https://www.qrisk.org
-	# see paper: Development and validation of QRISK3 risk prediction algorithms to estimate future risk of cardiovascular disease: prospective cohort study, BMJ 2017;357:j2099
+	# Calculate the base CVD chance for a female (see qrisk3_female)
 	def base_cvd_female(self, bmi = 26.8, rati = 3.5, sbp = 123, sbps5 = 5):
-		age = self.age
-		dage = age/10.0
-		age_1 = math.pow(dage,-2)
-		age_2 = dage
-		dbmi = bmi/10.0
-		bmi_1 = math.pow(dbmi,-2)
-		bmi_2 = math.pow(dbmi,-2) * math.log(dbmi)
-
-		# Centring the continuous variables
-		age_1 = age_1 - 0.053274843841791
-		age_2 = age_2 - 4.332503318786621
-		bmi_1 = bmi_1 - 0.154946178197861
-		bmi_2 = bmi_2 - 0.144462317228317
-		rati = rati - 3.476326465606690
-		sbp = sbp - 123.130012512207030
-		sbps5 = sbps5 - 9.002537727355957
-
-		# Start of Sum
-		a = 0
-
-		# Sum from continuous values
-		a += age_1 * -8.1388109247726188000000000
-		a += age_2 * 0.7973337668969909800000000
-		a += bmi_1 * 0.2923609227546005200000000
-		a += bmi_2 * -4.1513300213837665000000000
-		a += rati * 0.1533803582080255400000000
-		a += sbp * 0.0131314884071034240000000
-		a += sbps5 * 0.0078894541014586095000000
-
-		# Sum from interaction terms
-		a += age_1 * bmi_1 * 23.8026234121417420000000000
-		a += age_1 * bmi_2 * -71.1849476920870070000000000
-		a += age_1 * sbp * 0.0341318423386154850000000
-		a += age_2 * bmi_1 * 0.5236995893366442900000000
-		a += age_2 * bmi_2 * 0.0457441901223237590000000
-		a += age_2 * sbp * -0.0015082501423272358000000
-
-		# Calculate the score itself
-		score = 100.0 * (1 - math.pow(0.988876402378082, math.exp(a)))
-		self.cv_chance = score / 100.0
-
-
-	# Calculate the base CVD chance for a male, based on age, bmi, cholesterol and blood pressure.
-	# code adapted from algorithm provided by the QRISK3 team: https://www.qrisk.org
-	# see paper: Development and validation of QRISK3 risk prediction algorithms to estimate future risk of cardiovascular disease: prospective cohort study, BMJ 2017;357:j2099
+		self.cv_chance = qrisk3_female(self.age, bmi, rati, sbp, sbps5)
+
+
+	# Calculate the base CVD chance for a male (see qrisk3_male)
 	def base_cvd_male(self, bmi = 27.7, rati = 4.1, sbp = 130, sbps5 = 7):
-		age = self.age
-		dage=age/10.0
-		age_1 = math.pow(dage,-1)
-		age_2 = math.pow(dage,3)
-		dbmi=bmi/10.0
-		bmi_2 = math.pow(dbmi,-2)*math.log(dbmi)
-		bmi_1 = math.pow(dbmi,-2)
-
-		# Centring the continuous variables
-		age_1 = age_1 - 0.234766781330109
-		age_2 = age_2 - 77.284080505371094
-		bmi_1 = bmi_1 - 0.149176135659218
-		bmi_2 = bmi_2 - 0.141913309693336
-		rati = rati - 4.300998687744141
-		sbp = sbp - 128.571578979492190
-		sbps5 = sbps5 - 8.756621360778809
-
-		# Start of Sum
-		a=0
-
-		# Sum from continuous values
-		a += age_1 * -17.8397816660055750000000000;
-		a += age_2 * 0.0022964880605765492000000;
-		a += bmi_1 * 2.4562776660536358000000000;
-		a += bmi_2 * -8.3011122314711354000000000;
-		a += rati * 0.1734019685632711100000000;
-		a += sbp * 0.0129101265425533050000000;
-		a += sbps5 * 0.0102519142912904560000000;
-
-		# Sum from interaction terms
-		a += age_1 * bmi_1 * 31.0049529560338860000000000
-		a += age_1 * bmi_2 * -111.2915718439164300000000000
-		a += age_1 * sbp * 0.0188585244698658530000000
-		a += age_2 * bmi_1 * 0.0050380102356322029000000;
-		a += age_2 * bmi_2 * -0.0130744830025243190000000;
-		a += age_2 * sbp * -0.0000127187419158845700000;
-
-		# Calculate the score itself
-		score = 100.0 * (1 - math.pow(0.977268040180206, math.exp(a)))
-		self.cv_chance = score / 100.0
+		self.cv_chance = qrisk3_male(self.age, bmi, rati, sbp, sbps5)
 
 
 	# Should be done after the update_risk_level method is called
@@ -344,3 +396,169 @@ class Agent:
 		self.inactivity_level = self.inactivity_level_temp
 		self.alcohol_level = self.alcohol_level_temp
 		self.diet_level = self.diet_level_temp
+
+
+## Batched level selection ##
+
+# Calculate the next level of one behaviour for many agents at once (the batched equivalent of
+# Agent.next_smoking_level etc.).
+# inc_inf is an (N, 3) array of incoming influence for levels 0-2, threshold and current are the
+# agents' thresholds and current levels. Levels whose influence reaches the threshold are candidates;
+# with none the agent keeps its level, otherwise a candidate is picked with probability proportional
+# to its influence. For smoking, agents at level 1 or 2 can never return to level 0, so their level 0
+# influence is added to level 1.
+# The uniform draws for the weighted choice are taken in bulk from rng (a numpy Generator).
+def next_levels(inc_inf, threshold, current, rng, smoking = False):
+	inc_inf = np.array(inc_inf, dtype=np.float64)
+	if smoking:
+		smoked = current != 0
+		inc_inf[smoked, 1] += inc_inf[smoked, 0]
+		inc_inf[smoked, 0] = 0.0
+	over = inc_inf >= threshold[:, None]
+	if smoking:
+		over[smoked, 0] = False
+
+	# weighted choice among the levels over threshold
+	weights = np.where(over, inc_inf, 0.0)
+	cum = np.cumsum(weights, axis=1)
+	with np.errstate(invalid='ignore', divide='ignore'):
+		cum = cum / cum[:, -1:]
+	choice = (rng.random(len(current))[:, None] >= cum).sum(axis=1)
+	# guard against rounding in the cumulative sum by falling back to the highest candidate
+	highest = 2 - np.argmax(over[:, ::-1], axis=1)
+	choice = np.minimum(choice, highest)
+
+	return np.where(over.any(axis=1), choice, current).astype(current.dtype)
+
+
+## AgentTable class ##
+
+## Struct-of-arrays store of the agent attributes, one NumPy column per attribute ##
+
+# order of the behaviour level columns (matching the Agent *_level attributes)
+BEHAVIOUR_COLUMNS = ['smoking', 'alcohol', 'diet', 'inactivity']
+
+# index used for the sex column
+SEX_INDEX = {'M': 0, 'F': 1}
+
+class AgentTable:
+	# name and dtype of each column
+	# sex uses SEX_INDEX, workplace_type is 0 for agents without a workplace,
+	# intervention is the intervention group (0 = none), household and workplace are
+	# group ids (workplace is -1 for agents without a workplace)
+	COLUMNS = {
+		'id': np.int64,
+		'sex': np.int8,
+		'age': np.int16,
+		'imd': np.int8,
+		'threshold': np.float64,
+		'smoking': np.int8,
+		'alcohol': np.int8,
+		'diet': np.int8,
+		'inactivity': np.int8,
+		'workplace_type': np.int8,
+		'intervention': np.int8,
+		'household': np.int32,
+		'workplace': np.int32,
+		'alive': np.bool_,
+	}
+
+	def __init__(self, n):
+		for name, dtype in self.COLUMNS.items():
+			setattr(self, name, np.zeros(n, dtype=dtype))
+		self.workplace[:] = -1
+		self.alive[:] = True
+
+	def __len__(self):
+		return len(self.id)
+
+
+	# build a table from a list of agents; row i holds agents[i]
+	@classmethod
+	def from_agents(cls, agents):
+		table = cls(len(agents))
+		table.id[:] = [a.id for a in agents]
+		table.sex[:] = [SEX_INDEX[a.sex] for a in agents]
+		table.age[:] = [a.age for a in agents]
+		table.imd[:] = [0 if a.imd is None else a.imd for a in agents]
+		table.threshold[:] = [a.threshold for a in agents]
+		for b in BEHAVIOUR_COLUMNS:
+			getattr(table, b)[:] = [getattr(a, b + '_level') for a in agents]
+		table.workplace_type[:] = [0 if a.workplace_type is None else a.workplace_type for a in agents]
+		table.intervention[:] = [a.intervention for a in agents]
+		table.household[:] = [-1 if a.household_id is None else a.household_id for a in agents]
+		table.workplace[:] = [-1 if a.workplace_id is None else a.workplace_id for a in agents]
+		table.alive[:] = [a.alive for a in agents]
+		return table
+
+
+	# build a table from a dict of columns (e.g. from Network.synthesise_households)
+	# columns not supplied keep their defaults; 'levels' may be given as an (n, 4) array
+	@classmethod
+	def from_columns(cls, columns):
+		n = len(next(iter(columns.values())))
+		table = cls(n)
+		table.id[:] = np.arange(n)
+		for name, values in columns.items():
+			if name == 'levels':
+				for i, b in enumerate(BEHAVIOUR_COLUMNS):
+					getattr(table, b)[:] = values[:, i]
+			elif name in cls.COLUMNS:
+				getattr(table, name)[:] = values
+		return table
+
+
+	# behaviour levels as an (n, 4) array in BEHAVIOUR_COLUMNS order
+	def levels(self):
+		return np.stack([getattr(self, b) for b in BEHAVIOUR_COLUMNS], axis=1)
+
+
+	# new table holding the given rows (index array or boolean mask)
+	def take(self, rows):
+		table = AgentTable(0)
+		for name in self.COLUMNS:
+			setattr(table, name, getattr(self, name)[rows])
+		return table
+
+
+	# write the column values back into the agents the table was built from
+	def update_agents(self, agents):
+		sexes = list(SEX_INDEX.keys())
+		columns = [self.sex.tolist(), self.age.tolist(), self.imd.tolist(), self.threshold.tolist(), \
+			self.workplace_type.tolist(), self.intervention.tolist(), self.household.tolist(), self.workplace.tolist(), \
+			self.alive.tolist()] + [getattr(self, b).tolist() for b in BEHAVIOUR_COLUMNS]
+		for a, sex, age, imd, threshold, wtype, intervention, household, workplace, alive, smoking, alcohol, diet, inactivity in zip(agents, *columns):
+			a.sex = sexes[sex]
+			a.age = age
+			a.imd = imd
+			a.threshold = threshold
+			a.workplace_type = None if wtype == 0 else wtype
+			a.intervention = intervention
+			a.household_id = None if household < 0 else household
+			a.workplace_id = None if workplace < 0 else workplace
+			a.alive = alive
+			a.smoking_level = smoking
+			a.alcohol_level = alcohol
+			a.diet_level = diet
+			a.inactivity_level = inactivity
+
+
+	# create new Agent objects (without relationships) from the table
+	# risk_factors maps sex ('M'/'F') to the behaviour CVD risk dict (see Parameters.pick_risk_factors)
+	# the agents copy the attributes of one template agent instead of each running Agent.__init__,
+	# as every attribute that varies between agents is then set from the table
+	def to_agents(self, risk_factors):
+		template = Agent('M', 0, risk_factors['M'], {b: 0 for b in BEHAVIOUR_COLUMNS}, 0).__dict__
+		sexes = list(SEX_INDEX.keys())
+		agents = list()
+		for agent_id, sex in zip(self.id.tolist(), self.sex.tolist()):
+			a = Agent.__new__(Agent)
+			a.__dict__.update(template)
+			a.id = agent_id
+			a.risk_factors = risk_factors[sexes[sex]]
+			a.household = []
+			a.friends = []
+			a.workplace = []
+			agents.append(a)
+		self.update_agents(agents)
+		return agents
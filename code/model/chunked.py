@@ -0,0 +1,215 @@
+import random
+import numpy as np
+import parameters
+import spread
+import store
+from agent import BEHAVIOUR_COLUMNS, SEX_INDEX, next_levels
+from network import Network, RELATIONSHIPS
+
+# number of agents (rows of the store) processed at a time
+CHUNK_SIZE = 1 << 20
+
+# age bands of the CVD incidence counts (see Spread_Model.cvd_count), five years each from age 25
+AGE_BANDS = ['25-29', '30-34', '35-39', '40-44', '45-49', '50-54', \
+	'55-59', '60-64', '65-69', '70-74', '75-79', '80-84']
+
+# Spread model for a population held in a memory-mapped store (see store.write_store) instead of as Agent
+# objects: the agent columns and relationship layers stay on disk and every time step reads them
+# sequentially, chunk_size rows at a time, so the population is bounded by disk rather than memory
+# only the behaviour levels and alive flags at the start of the step (looked up at random for the
+# neighbours of each chunk), the joint household/workplace groups and the per-group level counts are
+# held in memory, a few tens of bytes per agent
+# influence is computed as by the matrix engine; with a single chunk the random draws are taken in the
+# same order, so the results are the same as the matrix engine's for the same population and seed
+class Spread_Model(spread.Spread_Model):
+	def __init__(self, folder, inf_by_rel, base_filename, cvd_table, chunk_size=CHUNK_SIZE):
+
+		super().__init__([], inf_by_rel, base_filename, engine='matrix', cvd_table=cvd_table)
+
+		# the store has no risk factors to build the CVD probability table from
+		if cvd_table is None:
+			print("Error: the chunked model requires a cvd_table (see Parameters.cvd_table)")
+			exit(1)
+
+		# mapped agent columns and spouse/friendship layers
+		self.table, self.layers = store.open_store(folder)
+		self.chunk_size = chunk_size
+		self.joint = Network.joint_groups(np.asarray(self.table.household), np.asarray(self.table.workplace))
+		self.weights = np.stack([parameters.influence_array(inf) for inf in self.inf_tables])
+		self.rng = None
+
+		# living agents, as rows of the store
+		self.agents = np.flatnonzero(self.table.alive)
+
+		# total (ten year) CVD chance of the living agents, for analytics
+		self.cv_total = 0.0
+
+
+	# (start, stop) rows of each chunk
+	def chunks(self):
+		n = len(self.table)
+		for lo in range(0, n, self.chunk_size):
+			yield lo, min(lo + self.chunk_size, n)
+
+
+	# define the main simulation
+	def simulation(self, maxLength):
+		for i in range(maxLength):
+			print("Beginning timestep : " + str(i))
+			print("Current population size: " + str(len(self.agents)))
+
+			self.population = self.population + [len(self.agents)]
+
+			# random number generator for the batched draws, seeded from the random module (as by the matrix engine)
+			if self.rng is None:
+				self.rng = np.random.default_rng(random.getrandbits(64))
+
+			# levels and alive flags at the start of the time step, from which all agents' influence is computed
+			levels = self.table.levels()
+			alive = np.array(self.table.alive)
+			self.chunked_influence(levels, alive)
+
+			cvd_metrics = {'M': 0, 'F': 0, 'imd1': 0, 'imd2': 0, 'imd3': 0, 'imd4': 0, 'imd5': 0, 'avg_age': 0}
+			self.deceased[i] = self.chunked_cvd_test(cvd_metrics)
+			self.agents = np.flatnonzero(self.table.alive)
+
+			cvd_metrics['avg_age'] = cvd_metrics['avg_age'] / len(self.deceased[i])
+			cvd_metrics['total'] = len(self.deceased[i])
+			self.cvd_demographics.append(cvd_metrics)
+
+			print("Timestep " + str(i) + " finished. Calculating analytics.")
+			self.analytics(i)
+		store.flush_store(self.table)
+		print("Finished running simulation.")
+
+
+	# compute the incoming influence for each chunk of agents and write their next behaviour levels to the store
+	def chunked_influence(self, levels, alive):
+		totals = {name: self.group_totals(group, levels, alive) for name, group in \
+			[('Household', self.table.household), ('Workplace', self.table.workplace), ('Joint', self.joint)]}
+		for lo, hi in self.chunks():
+			inc_inf = np.zeros((hi - lo, len(BEHAVIOUR_COLUMNS), 3))
+			intervention = self.table.intervention[lo:hi]
+			for r, rel in enumerate(RELATIONSHIPS):
+				wtype = self.table.workplace_type[lo:hi] if rel == 'Workplace' else 0
+				inc_inf += self.chunk_counts(rel, lo, hi, levels, alive, totals) * self.weights[intervention, r, wtype]
+
+			live = np.flatnonzero(alive[lo:hi])
+			threshold = self.table.threshold[lo:hi][live]
+			for b, name in enumerate(BEHAVIOUR_COLUMNS):
+				getattr(self.table, name)[lo + live] = next_levels(inc_inf[live, b], threshold, levels[lo + live, b], \
+					self.rng, smoking = (name == 'smoking'))
+
+
+	# number of living agents at each behaviour level influencing each agent of a chunk through a relationship,
+	# as an array of shape (agent, behaviour, level) (see spread.Spread_Model.relationship_counts)
+	def chunk_counts(self, rel, lo, hi, levels, alive, totals):
+		if rel in self.layers:
+			return self.layer_counts(self.layers[rel], lo, hi, levels, alive)
+		if rel == 'Household':
+			own = np.zeros((hi - lo, len(BEHAVIOUR_COLUMNS), 3))
+			live = np.flatnonzero(alive[lo:hi])
+			own[live[:, None], np.arange(len(BEHAVIOUR_COLUMNS)), levels[lo + live]] = 1
+			counts = self.group_counts(totals['Household'], self.table.household[lo:hi]) - own
+			return counts - self.layer_counts(self.layers['Spouse'], lo, hi, levels, alive, self.table.household)
+		counts = self.group_counts(totals['Workplace'], self.table.workplace[lo:hi]) - \
+			self.group_counts(totals['Joint'], self.joint[lo:hi])
+		return counts - self.layer_counts(self.layers['Friendship'], lo, hi, levels, alive, self.table.workplace)
+
+
+	# number of living neighbours of the rows lo to hi along a CSR layer at each behaviour level
+	# if same is given (a group id column), only neighbours in the same group (not -1) are counted
+	def layer_counts(self, layer, lo, hi, levels, alive, same=None):
+		offsets = np.asarray(layer.offsets[lo:hi + 1])
+		indices = np.asarray(layer.indices[offsets[0]:offsets[-1]])
+		rows = np.repeat(np.arange(hi - lo), np.diff(offsets))
+		live = alive[indices]
+		if same is not None:
+			group = np.asarray(same[lo:hi])[rows]
+			live = live & (group == same[indices]) & (group >= 0)
+		counts = np.empty((hi - lo, len(BEHAVIOUR_COLUMNS), 3))
+		for b in range(len(BEHAVIOUR_COLUMNS)):
+			onehot = rows * 3 + levels[indices, b]
+			counts[:, b] = np.bincount(onehot, weights=live, minlength=3 * (hi - lo)).reshape(-1, 3)
+		return counts
+
+
+	# number of living members of each group at each behaviour level, as an array of shape (group, behaviour,
+	# level) with an extra, empty, last group for agents without one (-1)
+	# the counts are accumulated a chunk at a time over the range of group ids in the chunk, which is short
+	# when the members of a group are stored close together (as generated)
+	def group_totals(self, group, levels, alive):
+		n_groups = int(group.max()) + 1
+		n_levels = len(BEHAVIOUR_COLUMNS) * 3
+		totals = np.zeros((n_groups + 1) * n_levels, dtype=np.int32)
+		for lo, hi in self.chunks():
+			g = np.asarray(group[lo:hi])
+			member = (g >= 0) & alive[lo:hi]
+			if not member.any():
+				continue
+			key = (g[member, None] * len(BEHAVIOUR_COLUMNS) + np.arange(len(BEHAVIOUR_COLUMNS))) * 3 + levels[lo:hi][member]
+			first = int(key.min())
+			counts = np.bincount(key.ravel() - first)
+			totals[first:first + len(counts)] += counts.astype(np.int32)
+		return totals.reshape(n_groups + 1, len(BEHAVIOUR_COLUMNS), 3)
+
+
+	# group totals (see group_totals) for each agent of a chunk, given the chunk's group ids
+	def group_counts(self, totals, group):
+		group = np.asarray(group)
+		return totals[np.where(group >= 0, group, len(totals) - 1)]
+
+
+	# test each chunk of living agents for a CVD event using the updated levels (as matrix_cvd_test), recording
+	# the person years and deaths, marking the dead agents in the store and ageing the survivors
+	# returns the rows of the agents that died
+	def chunked_cvd_test(self, cvd_metrics):
+		sexes = list(SEX_INDEX.keys())
+		dead = list()
+		self.cv_total = 0.0
+		for lo, hi in self.chunks():
+			rows = lo + np.flatnonzero(self.table.alive[lo:hi])
+			sex = self.table.sex[rows]
+			age = self.table.age[rows]
+			self.count_by_age(self.person_years, sex, age)
+
+			levels = np.stack([getattr(self.table, b)[rows] for b in BEHAVIOUR_COLUMNS], axis=1)
+			p = parameters.cvd_probability(self.cvd_table, sex, age, levels)
+			event = self.rng.random(len(p)) < p
+
+			self.count_by_age(self.cvd_count, sex[event], age[event])
+			for s, name in enumerate(sexes):
+				cvd_metrics[name] = cvd_metrics[name] + int(np.count_nonzero(sex[event] == s))
+			imd = self.table.imd[rows[event]]
+			for q in range(1, 6):
+				cvd_metrics['imd' + str(q)] = cvd_metrics['imd' + str(q)] + int(np.count_nonzero(imd == q))
+			cvd_metrics['avg_age'] = cvd_metrics['avg_age'] + int(age[event].sum())
+
+			self.table.alive[rows[event]] = False
+			self.table.age[rows[~event]] = age[~event] + 1
+			self.cv_total = self.cv_total + float(p[~event].sum()) * 10.0
+			dead.append(rows[event])
+		return np.concatenate(dead)
+
+
+	# add the number of agents of each sex in each age band to counts (self.person_years or self.cvd_count)
+	def count_by_age(self, counts, sex, age):
+		band = (age.astype(np.int64) - 25) // 5
+		counted = (band >= 0) & (band < len(AGE_BANDS))
+		tally = np.bincount(sex[counted] * len(AGE_BANDS) + band[counted], minlength=len(SEX_INDEX) * len(AGE_BANDS))
+		for s, name in enumerate(SEX_INDEX.keys()):
+			for a, age_band in enumerate(AGE_BANDS):
+				counts[name][age_band] = counts[name][age_band] + int(tally[s * len(AGE_BANDS) + a])
+
+
+	# average CVD risk and behaviour prevalence of the living agents (see spread.Spread_Model.analytics)
+	def analytics(self, i):
+		print("Number of agents: " + str(len(self.agents)))
+		self.avg_cvd.append(self.cv_total / len(self.agents))
+
+		behaviour_count = {b: np.zeros(3) for b in BEHAVIOUR_COLUMNS}
+		for lo, hi in self.chunks():
+			live = self.table.alive[lo:hi]
+			for b in BEHAVIOUR_COLUMNS:
+				behaviour_count[b] += np.bincount(getattr(self.table, b)[lo:hi][live], minlength=3)
+		self.behaviour_prevalence.append({b: (count / len(self.agents)).tolist() for b, count in behaviour_count.items()})
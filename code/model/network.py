@@ -4,30 +4,357 @@ import matplotlib.pyplot as plt
 from pathlib import Path
 import os
 import gc
+import multiprocessing
 import networkx as nx
 import argparse
+import numpy as np
 from agent import Agent
 import parameters
 
+# relationship layers, in order of precedence (and matching the keys of Parameters.inf_by_rel)
+RELATIONSHIPS = parameters.RELATIONSHIPS
+
+
+# compressed sparse row adjacency for one relationship layer
+# the neighbours of row i are indices[offsets[i]:offsets[i + 1]]; edge_type optionally holds
+# a per-edge value (the workplace type for the workplace layer)
+class CSR:
+    def __init__(self, offsets, indices, edge_type=None) -> None:
+        self.offsets = offsets
+        self.indices = indices
+        self.edge_type = edge_type
+
+    # build from per-row neighbour lists (of row indices)
+    @classmethod
+    def from_lists(cls, neighbours, edge_type=None):
+        offsets = np.zeros(len(neighbours) + 1, dtype=np.int32)
+        np.cumsum([len(n) for n in neighbours], out=offsets[1:])
+        indices = np.fromiter((j for n in neighbours for j in n), dtype=np.int32, count=offsets[-1])
+        if edge_type is not None:
+            edge_type = np.repeat(np.asarray(edge_type, dtype=np.int8), np.diff(offsets))
+        return cls(offsets, indices, edge_type)
+
+    # build from arrays of (row, neighbour) pairs for a population of n agents
+    # edges keep their given order within each row
+    @classmethod
+    def from_edges(cls, rows, cols, n, edge_type=None):
+        # a stable sort by row, done as an (unstable, much faster) sort of 64-bit keys of row and position
+        order = np.sort((np.asarray(rows, dtype=np.int64) << 32) | np.arange(len(rows), dtype=np.int64)) & 0xFFFFFFFF
+        offsets = np.zeros(n + 1, dtype=np.int32)
+        np.cumsum(np.bincount(rows, minlength=n), out=offsets[1:])
+        if edge_type is not None:
+            edge_type = np.asarray(edge_type, dtype=np.int8)[order]
+        return cls(offsets, np.asarray(cols, dtype=np.int32)[order], edge_type)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def degree(self):
+        return np.diff(self.offsets)
+
+    def neighbours(self, i):
+        return self.indices[self.offsets[i]:self.offsets[i + 1]]
+
+    # row index of each edge (i.e. the agent receiving influence along the edge)
+    def rows(self):
+        return np.repeat(np.arange(len(self), dtype=np.int32), self.degree())
+
+    # keep only the edges where mask is True (rows are unchanged)
+    def select(self, mask):
+        offsets = np.zeros(len(self) + 1, dtype=np.int32)
+        np.cumsum(np.bincount(self.rows()[mask], minlength=len(self)), out=offsets[1:])
+        edge_type = None if self.edge_type is None else self.edge_type[mask]
+        return CSR(offsets, self.indices[mask], edge_type)
+
+    # restrict to the rows where keep is True, dropping edges to removed rows and renumbering the rest
+    def take(self, keep):
+        new_index = np.cumsum(keep, dtype=np.int32) - 1
+        rows = self.rows()
+        edges = keep[rows] & keep[self.indices]
+        edge_type = None if self.edge_type is None else self.edge_type[edges]
+        return CSR.from_edges(new_index[rows[edges]], new_index[self.indices[edges]], int(keep.sum()), edge_type)
+
+    # renumber the rows so that new row i is old row order[i] (a permutation, see locality_order), keeping the
+    # order of the edges within each row
+    def permute(self, order):
+        inverse = np.empty(len(order), dtype=np.int32)
+        inverse[order] = np.arange(len(order), dtype=np.int32)
+        degree = self.degree()[order]
+        offsets = np.zeros(len(self) + 1, dtype=np.int32)
+        np.cumsum(degree, out=offsets[1:])
+        edges = np.repeat(np.asarray(self.offsets[:-1])[order] - offsets[:-1], degree) + np.arange(offsets[-1])
+        edge_type = None if self.edge_type is None else self.edge_type[edges]
+        return CSR(offsets, inverse[self.indices[edges]], edge_type)
+
+
+# friendship graph generators
+# both return the undirected edges as a pair of int32 arrays (u, v) on nodes 0 to n - 1 and draw from
+# the numpy Generator rng, matching the topology of the networkx generators of the same name without
+# building a graph object
+
+# Newman-Watts-Strogatz: a ring in which each node is joined to its k // 2 nearest neighbours on each
+# side, plus, for each ring edge (u, v) with probability p, a shortcut from u to a uniformly random other
+# node (shortcuts duplicating an existing edge are dropped, where networkx would redraw them)
+def newman_watts_strogatz_edges(n, k, p, rng):
+    su, sv = newman_watts_strogatz_shortcuts(n, k, p, rng)
+    return newman_watts_strogatz_graph(n, k, su, sv)
+
+
+# the shortcuts of a Newman-Watts-Strogatz graph on n nodes, as arrays of (source, target) nodes
+# a graph on n_old nodes with shortcuts (su, sv) is grown to n nodes by drawing the shortcuts of the ring
+# edges of the new nodes and moving each old shortcut to a uniformly random new node with probability
+# (n - n_old) / (n - 1), so that every shortcut target stays uniform over the other n - 1 nodes
+def newman_watts_strogatz_shortcuts(n, k, p, rng, n_old=0, su=None, sv=None):
+    u = np.tile(np.arange(n_old, n, dtype=np.int32), k // 2)
+    shortcut = rng.random(len(u)) < p
+    new_su = u[shortcut]
+    # offset by 1 to n - 1 so a shortcut never loops back to its own node
+    new_sv = ((new_su + rng.integers(1, n, size=len(new_su))) % n).astype(np.int32)
+    if su is None:
+        return new_su, new_sv
+    sv = sv.copy()
+    moved = rng.random(len(sv)) < (n - n_old) / (n - 1)
+    sv[moved] = rng.integers(n_old, n, size=int(moved.sum()))
+    return np.concatenate([su, new_su]), np.concatenate([sv, new_sv])
+
+
+# the undirected edges of a Newman-Watts-Strogatz graph on n nodes: the ring plus the shortcuts (su, sv)
+def newman_watts_strogatz_graph(n, k, su, sv):
+    u = np.tile(np.arange(n, dtype=np.int32), k // 2)
+    v = (u + np.repeat(np.arange(1, k // 2 + 1, dtype=np.int32), n)) % n
+    return unique_edges(np.concatenate([u, su]), np.concatenate([v, sv]), n)
+
+
+# Barabasi-Albert: starting from a star on nodes 0 to m, each further node attaches m edges to distinct
+# existing nodes chosen with probability proportional to their degree
+# uses the Batagelj-Brandes list of edge endpoints, where choosing a uniformly random earlier endpoint is
+# choosing a node in proportion to its degree; the endpoint of an edge that copies another edge's endpoint
+# is resolved for all edges at once by pointer jumping, and picks repeating a target of the same node are
+# redrawn (as in networkx) until every node has m distinct targets
+# known optionally holds the targets of a graph already grown to fewer nodes (in edge order), which is
+# grown to n nodes by attaching the further nodes in the same way
+def barabasi_albert_edges(n, m, rng, known=None):
+    n_edges = m * (n - m)
+    # edge e has source node src[e]: the star edges come first, then m edges for each further node
+    src = np.empty(n_edges, dtype=np.int32)
+    src[:m] = np.arange(1, m + 1)
+    src[m:] = np.repeat(np.arange(m + 1, n, dtype=np.int32), m)
+    if known is None:
+        known = np.zeros(m, dtype=np.int32)
+    # each edge of a new node picks one of the 2 * (edges before that node) earlier endpoints, where
+    # endpoint 2e is the source and endpoint 2e + 1 the target of edge e
+    n_earlier = 2 * m * (src[len(known):].astype(np.int64) - m)
+    pick = (rng.random(len(n_earlier)) * n_earlier).astype(np.int64)
+    while True:
+        tgt = resolve_endpoints(src, known, pick)
+        # compare the sorted targets of each new node to find the repeated ones
+        targets = tgt[len(known):].reshape(-1, m)
+        order = np.argsort(targets, axis=1)
+        ranked = np.take_along_axis(targets, order, axis=1)
+        repeat = np.zeros(targets.shape, dtype=bool)
+        np.put_along_axis(repeat, order[:, 1:], ranked[:, 1:] == ranked[:, :-1], axis=1)
+        redraw = np.flatnonzero(repeat.ravel())
+        if len(redraw) == 0:
+            break
+        pick[redraw] = (rng.random(len(redraw)) * n_earlier[redraw]).astype(np.int64)
+    # every edge joins a new node to a distinct earlier node, so there are no loops or repeats to remove
+    return src, tgt
+
+
+# target of each edge of barabasi_albert_edges, given the known targets of the first edges and the
+# endpoint picked by each edge after them
+def resolve_endpoints(src, known, pick):
+    first = len(known)
+    tgt = np.full(len(src), -1, dtype=np.int32)
+    tgt[:first] = known
+    from_source = pick % 2 == 0
+    tgt[first:][from_source] = src[pick[from_source] // 2]
+    # targets copied from another edge's target point back to an earlier edge; jump pointers until resolved
+    pointer = np.zeros(len(src), dtype=np.int64)
+    pointer[first:] = pick // 2
+    pending = np.flatnonzero(tgt < 0)
+    while len(pending) > 0:
+        resolved = tgt[pointer[pending]]
+        done = resolved >= 0
+        tgt[pending[done]] = resolved[done]
+        pending = pending[~done]
+        pointer[pending] = pointer[pointer[pending]]
+    return tgt
+
+
+# undirected edges with self-loops and repeated pairs removed, each pair given once with u < v
+def unique_edges(u, v, n):
+    key = np.sort(pair_keys(u, v, n)[u != v])
+    key = key[np.r_[True, key[1:] != key[:-1]]]
+    return (key // n).astype(np.int32), (key % n).astype(np.int32)
+
+
+# relationship precedence (spouse > household > friends > workplace) is applied to pairs of agent rows
+# encoded as 64-bit keys, the same for (u, v) and (v, u) in a population of n
+def pair_keys(u, v, n):
+    return np.minimum(u, v).astype(np.int64) * n + np.maximum(u, v)
+
+
+# remove the pairs (u, v) already related through a higher-precedence relationship,
+# given as a sorted array of pair keys (merged by binary search)
+def remove_pairs(u, v, n, related):
+    keys = pair_keys(u, v, n)
+    pos = np.minimum(np.searchsorted(related, keys), max(len(related) - 1, 0))
+    keep = related[pos] != keys if len(related) > 0 else np.ones(len(keys), dtype=bool)
+    return u[keep], v[keep]
+
+
+# all ordered pairs of different members of the same group
+# members lists agent rows with the members of each group contiguous, and group is the group id of every
+# agent row; the pairs are returned grouped by their first member, in the order of members
+def group_pairs(members, group):
+    ids = group[members]
+    bounds = np.flatnonzero(np.r_[True, ids[1:] != ids[:-1], True])
+    sizes = np.diff(bounds)
+    # each member is paired with every member of its group, starting from the first member of the group
+    size = np.repeat(sizes, sizes)
+    first = np.repeat(bounds[:-1], sizes)
+    u = np.repeat(np.arange(len(members)), size)
+    v = np.repeat(first, size) + np.arange(len(u)) - np.repeat(np.cumsum(size) - size, size)
+    keep = u != v
+    return members[u[keep]], members[v[keep]]
+
+
+# set the given relationship list (e.g. 'friends') of each agent from pairs of agent rows (u, v),
+# meaning agent_list[v] is in the list of agent_list[u]; the pairs must be grouped by u (as from
+# group_pairs) and lists keep the order of the pairs
+def set_relationship_lists(agent_list, u, v, relationship):
+    bounds = np.flatnonzero(np.r_[True, u[1:] != u[:-1], True]) if len(u) > 0 else np.zeros(1, dtype=np.int64)
+    # garbage collection is paused while the lists are allocated, only to avoid it repeatedly traversing
+    # every agent as they are; it is restarted even if building them fails
+    collecting = gc.isenabled()
+    gc.disable()
+    try:
+        related = list(map(agent_list.__getitem__, v.tolist()))
+        for i, start, end in zip(u[bounds[:-1]].tolist(), bounds[:-1].tolist(), bounds[1:].tolist()):
+            setattr(agent_list[i], relationship, related[start:end])
+    finally:
+        if collecting:
+            gc.enable()
+
+
+# cache-locality orderings of the agent rows (see locality_order)
+# 'household' keeps the members of each household contiguous, 'bfs' also places households close to the
+# households of their friends, in Cuthill-McKee order (breadth first from a household of least degree,
+# visiting the neighbours of each household in order of degree), and 'rcm' is that order reversed
+ORDERINGS = ['household', 'bfs', 'rcm']
+
+
+# permutation of the rows of a population (new row i holds old row order[i]) that places related agents
+# close together, so that the neighbour gathers of the influence step (levels[layer.indices] and the group
+# totals) read memory nearly sequentially rather than at random
+# household is the household id column and friends the friendship layer; the breadth first orderings are
+# taken over the graph of households joined by friendships, and households without friends go last
+def locality_order(household, friends, ordering='rcm'):
+    if ordering not in ORDERINGS:
+        print("Error: unknown ordering " + str(ordering) + ", expected one of", ORDERINGS)
+        exit(1)
+    _, hh = np.unique(household, return_inverse=True)
+    n_households = int(hh.max()) + 1 if len(hh) > 0 else 0
+    rank = np.arange(n_households)
+    if ordering != 'household':
+        graph = CSR.from_edges(hh[friends.rows()], hh[friends.indices], n_households)
+        visit = cuthill_mckee(graph)
+        if ordering == 'rcm':
+            visit = visit[::-1]
+        rank[visit] = np.arange(n_households)
+    return np.argsort(rank[hh], kind='stable')
+
+
+# nodes of a graph (CSR) in Cuthill-McKee order, found a breadth first level at a time: each level lists
+# the unvisited neighbours of the level before, grouped by the first node reaching them and by degree
+# each connected component starts from its unvisited node of least degree; isolated nodes go last
+def cuthill_mckee(graph):
+    degree = graph.degree()
+    visited = np.zeros(len(graph), dtype=bool)
+    starts = np.argsort(degree, kind='stable')
+    starts = starts[degree[starts] > 0]
+    levels = []
+    while True:
+        starts = starts[~visited[starts]]
+        if len(starts) == 0:
+            break
+        frontier = starts[:1]
+        visited[frontier] = True
+        while len(frontier) > 0:
+            levels.append(frontier)
+            count = degree[frontier]
+            parent = np.repeat(np.arange(len(frontier)), count)
+            edges = np.repeat(np.asarray(graph.offsets[frontier]) - np.cumsum(count) + count, count) + np.arange(count.sum())
+            child = np.asarray(graph.indices[edges])
+            new = ~visited[child]
+            parent, child = parent[new], child[new]
+            child = child[np.lexsort((degree[child], parent))]
+            _, first = np.unique(child, return_index=True)
+            frontier = child[np.sort(first)]
+            visited[frontier] = True
+    levels.append(np.flatnonzero(~visited))
+    return np.concatenate(levels)
+
+
+# synthesise the households of one shard of a population from its own seed (see Network.sharded_households);
+# a module function so that it can run in a worker process
+def synthesise_shard(task):
+    param, target_size, seed = task
+    return Network(param).synthesise_households(target_size, np.random.default_rng(seed))
+
+
+# join the household columns of consecutive shards (see Network.synthesise_households), renumbering
+# the household ids and spouse indices of each shard to follow on from those of the shards before it
+def concatenate_households(parts):
+    columns = {key: np.concatenate([part[key] for part in parts]) for key in parts[0]}
+    sizes = [len(part['household']) for part in parts]
+    first_agent = np.repeat(np.cumsum([0] + sizes[:-1]), sizes)
+    first_household = np.repeat(np.cumsum([0] + [int(part['household'][-1]) + 1 for part in parts[:-1]]), sizes)
+    columns['household'] += first_household.astype(np.int32)
+    married = columns['spouse'] >= 0
+    columns['spouse'][married] += first_agent[married].astype(np.int32)
+    return columns
+
+
 class Network:
     def __init__(self, parameters) -> None:
         self.param = parameters
 
     # generate the population of agents
-    def generate_agents(self, target_size):
+    # batch = True synthesises the households with vectorised draws (see synthesise_households)
+    # rather than one agent at a time; rng is the numpy Generator used in batch mode
+    # shards synthesises the households in batch mode as that many shards on a pool of processes
+    # (see sharded_households), with every draw (the households, friendship graph and sample of its
+    # nodes, workplaces and agent thresholds) from streams spawned from seed, so the population
+    # depends only on the seed and the number of shards
+    def generate_agents(self, target_size, batch=False, rng=None, shards=None, seed=None, processes=None):
         agent_list = []
         # track how many agents are actually created
         numAgents = 0
+        # track how many households have been created (used as the household ids)
+        numHouseholds = 0
         # create a list for agents who will need assigning to workplaces
         remaining_agents = []
-        # create the agents and households
+        if shards is not None:
+            seeds = np.random.SeedSequence(seed).spawn(shards + 1)
+            rng = np.random.default_rng(seeds[-1])
+            columns = concatenate_households(list(self.sharded_households(target_size, seeds[:-1], processes)))
+            agent_list, remaining_agents = self.households_to_agents(columns)
+            numAgents = len(agent_list)
+            numHouseholds = agent_list[-1].household_id + 1
+        elif batch:
+            agent_list, remaining_agents = self.households_to_agents(self.synthesise_households(target_size, rng))
+            numAgents = len(agent_list)
+            numHouseholds = agent_list[-1].household_id + 1
+        # create the agents and households (one at a time, unless already created in batch mode)
         while numAgents < target_size:
             debug = False
             # create a new agent with characteristics based on whole population distribution
             sex, age = self.param.pick_sex_age()
             risk_factors = self.param.pick_risk_factors(sex)
             initial_levels = self.param.pick_initial_levels(sex, age)
-            agent_list.append(Agent(sex, age, risk_factors, initial_levels))
+            agent_list.append(Agent(sex, age, risk_factors, initial_levels, len(agent_list)))
             # keep track of this agent
             firstInHousehold = agent_list[-1]
             # choose a size and index of deprivation for this agent's household
@@ -42,7 +369,7 @@ class Network:
                 sex, age = self.param.pick_spouse_sex_age(firstInHousehold.sex, firstInHousehold.age)
                 risk_factors = self.param.pick_risk_factors(sex)
                 initial_levels = self.param.pick_initial_levels(sex, age)
-                agent_list.append(Agent(sex, age, risk_factors, initial_levels))
+                agent_list.append(Agent(sex, age, risk_factors, initial_levels, len(agent_list)))
                 agent_list[-1].imd = imd
                 agent_list[-1].spouse = firstInHousehold
                 firstInHousehold.spouse = agent_list[-1]
@@ -59,7 +386,7 @@ class Network:
                 sex, age = self.param.pick_house_member_sex_age(firstInHousehold.sex, firstInHousehold.age, firstInHousehold.spouse)
                 risk_factors = self.param.pick_risk_factors(sex)
                 initial_levels = self.param.pick_initial_levels(sex, age)
-                agent_list.append(Agent(sex, age, risk_factors, initial_levels))
+                agent_list.append(Agent(sex, age, risk_factors, initial_levels, len(agent_list)))
                 agent_list[-1].imd = imd
                 firstInHousehold.household.append(agent_list[-1])
                 # pick whether the new agent should be assigned a workplace
@@ -93,6 +420,10 @@ class Network:
                 for i in range(1, h + 1):
                     print(agent_list[-i])
 
+            for a in agent_list[-h:]:
+                a.household_id = numHouseholds
+            numHouseholds += 1
+
             numAgents += h
             if (debug): print("target size: ", target_size, " actual size: ", numAgents)
 
@@ -103,92 +434,299 @@ class Network:
         fDebug = False
         friendNetworkSize = (int) (numAgents * (1.0 - self.param.graph_excluded))
         if (fDebug): print("Friendship network size: ", friendNetworkSize)
-        # create the underlying graph for the friendship network
+        # create the underlying graph for the friendship network, as arrays of edges between nodes 0 to friendNetworkSize - 1
+        if rng is None:
+            rng = np.random.default_rng(random.getrandbits(64))
         if self.param.graph_type == 'Newman–Watts–Strogatz':
             if (fDebug): print("Creating friendship network using Newman–Watts–Strogatz, k=" + str(self.param.graph_k) + ", p=" + str(self.param.graph_p))
-            graph = nx.newman_watts_strogatz_graph(friendNetworkSize, self.param.graph_k, self.param.graph_p, seed=None)
-        # elif self.param.graph_type == 'Watts–Strogatz':
-        #     if (fDebug): print("Creating friendship network using Watts–Strogatz, k=" + str(self.param.graph_k) + ", p=" + str(self.param.graph_p))
-        #     graph = nx.watts_strogatz_graph(friendNetworkSize, self.param.graph_k, self.param.graph_p, seed=None)
+            u, v = newman_watts_strogatz_edges(friendNetworkSize, self.param.graph_k, self.param.graph_p, rng)
         elif self.param.graph_type == 'Barabasi-Albert':
             if (fDebug): print("Creating friendship network using Barabasi-Albert, m=" + str(self.param.graph_m))
-            graph = nx.barabasi_albert_graph(friendNetworkSize, self.param.graph_m, seed=None)
+            u, v = barabasi_albert_edges(friendNetworkSize, self.param.graph_m, rng)
         else:
             print("Error: unknown graph type " + self.param.graph_type)
             exit(1)
-        # determine which agents in the population to put into the friendship graph
-        agentsWithCloseFriends = random.sample(agent_list, friendNetworkSize)
-        # create the graph
-        agent_map = dict(zip(range(0, friendNetworkSize), agentsWithCloseFriends))
-        nx.relabel_nodes(graph, agent_map, copy=False)
+        # determine which agents in the population (by row) to put into the friendship graph
+        if shards is not None:
+            closeFriends = rng.choice(numAgents, friendNetworkSize, replace=False).astype(np.int32)
+        else:
+            closeFriends = np.array(random.sample(range(numAgents), friendNetworkSize), dtype=np.int32)
+        u, v = closeFriends[u], closeFriends[v]
         # remove spouse and agents in household from friends (since relationships hierarchical)
-        for a in graph.nodes:
-            if graph.has_node(a.spouse):
-                if graph.has_edge(a, a.spouse):
-                    graph.remove_edge(a, a.spouse)
-            for h in a.household:
-                if graph.has_node(h):
-                    if graph.has_edge(a, h):
-                        graph.remove_edge(a, h)
+        household = np.array([a.household_id for a in agent_list])
+        related = np.sort(pair_keys(*group_pairs(np.arange(numAgents), household), numAgents))
+        u, v = remove_pairs(u, v, numAgents, related)
+        friends = CSR.from_edges(np.stack([u, v], axis=1).ravel(), np.stack([v, u], axis=1).ravel(), numAgents)
+        set_relationship_lists(agent_list, friends.rows(), friends.indices, 'friends')
 
-        
         # friendship relationships now defined
-        print("Created friendship network.", graph)
-        print("Average friendship degree (excluding spouse, household, workplace):", nx.number_of_edges(graph) / nx.number_of_nodes(graph))
-
-        # create the workplaces 
-        for a in remaining_agents:
-            # create a new workplace with a
-            wplace = [a]
-            remaining_agents.remove(a) 
-            # get a target workplace size
-            workplace_size = self.param.pick_workplace_contacts_size()
-            # if the number of agents remaining < target size, just add them to the workplace  
-            if len(remaining_agents) < workplace_size:
-                wplace = wplace + remaining_agents
-                remaining_agents.clear()
-            # otherwise create a workplace of the target size with randomly selected agents
-            else:
-                for i in range(workplace_size):
-                    employee = random.choice(remaining_agents)
-                    wplace.append(employee)
-                    remaining_agents.remove(employee)
-            wtype = self.param.pick_workplace_type()
+        print("Created friendship network with", friendNetworkSize, "nodes and", len(u), "edges")
+        print("Average friendship degree (excluding spouse, household, workplace):", len(u) / friendNetworkSize)
+
+        # create the workplaces, excluding friends as well
+        related = np.sort(np.concatenate([related, pair_keys(u, v, numAgents)]))
+        # agent ids are their rows of agent_list
+        self.assign_workplaces(agent_list, [a.id for a in remaining_agents], related, rng if shards is not None else None)
+
+        if shards is not None:
+            # thresholds are drawn as in Agent.__init__
+            for a, threshold in zip(agent_list, rng.normal(0.8, 0.05, numAgents).tolist()):
+                a.threshold = threshold
+
+        return agent_list
+
+
+    # synthesise the households for target_size agents as len(seeds) shards on a pool of processes
+    # households are independent until workplaces and friendships are wired, so each shard synthesises
+    # its share of the agents from its own numpy Generator (seeded by a numpy SeedSequence, e.g. a child
+    # spawned from one seed), and the result depends only on the seeds, not on the number of processes
+    # with chunk_size, each shard is synthesised as blocks of up to that many agents (each from a stream
+    # spawned from the shard's seed), so that the households can be appended a block at a time rather
+    # than held in memory together (the result then also depends on chunk_size)
+    # yields the household columns of each block in order (each block's households and spouses count
+    # from 0, see concatenate_households); every block completes its last household, so there may be up
+    # to a household per block more agents than the target
+    def sharded_households(self, target_size, seeds, processes=None, chunk_size=None):
+        shards = len(seeds)
+        sizes = [target_size // shards + (i < target_size % shards) for i in range(shards)]
+        tasks = []
+        for size, seed in zip(sizes, seeds):
+            if size == 0:
+                continue
+            if chunk_size is None:
+                tasks.append((self.param, size, seed))
+                continue
+            blocks = -(-size // chunk_size)
+            block_sizes = [size // blocks + (i < size % blocks) for i in range(blocks)]
+            tasks.extend((self.param, block_size, block_seed) for block_size, block_seed in zip(block_sizes, seed.spawn(blocks)))
+        with multiprocessing.Pool(processes) as pool:
+            yield from pool.imap(synthesise_shard, tasks)
+
+
+    # synthesise households as arrays, drawing each attribute for all households at once
+    # the draws follow the same distributions as the one-at-a-time path in generate_agents:
+    # a first member, an optional spouse, then additional members up to the household size
+    # returns a dict of per-agent columns in household order (first member, spouse, others)
+    def synthesise_households(self, target_size, rng=None):
+        p = self.param
+        if rng is None:
+            # seed from the random module so that random.seed() controls batch mode too
+            rng = np.random.default_rng(random.getrandbits(64))
+        # draw households in blocks until the target population size is reached
+        blocks = []
+        total = 0
+        while total < target_size:
+            block = self.draw_household_block(max(1000, (target_size - total) // 2), rng)
+            blocks.append(block)
+            total += block['size'].sum()
+        hh = {key: np.concatenate([b[key] for b in blocks]) for key in blocks[0]}
+        # keep households up to and including the one that reaches the target size
+        n_households = np.searchsorted(np.cumsum(hh['size']), target_size) + 1
+        hh = {key: value[:n_households] for key, value in hh.items()}
+        return self.layout_households(hh, rng)
+
+
+    # lay out the members of households drawn by draw_household_block, household by household:
+    # first member, spouse, then the others (drawn here along with each member's employment and levels)
+    # returns a dict of per-agent columns; household ids and spouse indices count from 0
+    def layout_households(self, hh, rng):
+        p = self.param
+        n_households = len(hh['size'])
+        size = hh['size']
+        household = np.repeat(np.arange(n_households, dtype=np.int32), size)
+        starts = np.cumsum(size) - size
+        position = np.arange(size.sum()) - np.repeat(starts, size)
+        n = len(household)
+        first = position == 0
+        spouse = (position == 1) & hh['married'][household]
+        others = ~first & ~spouse
+
+        sex = np.empty(n, dtype=np.int8)
+        age = np.empty(n, dtype=np.int16)
+        sex[first] = hh['sex']
+        age[first] = hh['age']
+        married = hh['married']
+        sex[starts[married] + 1] = hh['spouse_sex'][married]
+        age[starts[married] + 1] = hh['spouse_age'][married]
+        # additional household members are drawn from the whole population distribution
+        n_others = others.sum()
+        sex[others], age[others] = p.sample_sex_age(n_others, rng)
+        imd = np.repeat(hh['imd'], size)
+
+        # the spouse of the first member is not assigned a workplace (as in generate_agents)
+        employed = rng.random(n) < p.employment_prob(sex, age, imd)
+        employed[spouse] = False
+
+        # initial behaviour levels, one column per behaviour in parameters.BEHAVIOURS order
+        levels = p.sample_initial_levels(sex, age, rng)
+
+        # index of each agent's spouse (or -1)
+        spouse_index = np.full(n, -1, dtype=np.int32)
+        spouse_rows = np.flatnonzero(spouse)
+        spouse_index[spouse_rows] = spouse_rows - 1
+        spouse_index[spouse_rows - 1] = spouse_rows
+
+        return {'sex': sex, 'age': age, 'imd': imd, 'household': household, 'spouse': spouse_index,
+            'employed': employed, 'levels': levels}
+
+
+    # draw the contacts size and type of n workplaces (the batched equivalent of
+    # Parameters.pick_workplace_contacts_size and pick_workplace_type)
+    # the number of contacts only depends on the size band of the workplace, so the size itself is not drawn
+    def draw_workplaces(self, n, rng):
+        contacts = self.param.sample_workplace_contacts_size(n, rng)
+        return contacts, self.param.sample_workplace_type(n, rng)
+
+
+    # draw the household-level attributes for a block of households
+    def draw_household_block(self, n, rng):
+        p = self.param
+        sex, age = p.sample_sex_age(n, rng)
+        imd = p.sample_household_imd(sex, age, rng)
+        married = p.sample_married(sex, age, rng)
+        spouse_sex, spouse_age = p.sample_spouse(sex, age, rng)
+        size = p.sample_household_size(age, married, rng)
+        return {'sex': sex, 'age': age, 'imd': imd, 'married': married, 'spouse_sex': spouse_sex,
+            'spouse_age': spouse_age, 'size': size}
+
+
+    # create Agent objects (with spouse and household relationships) from synthesised households
+    # returns the agent list and the list of agents to be assigned to workplaces
+    def households_to_agents(self, columns):
+        keys = ['smoking', 'alcohol', 'diet', 'inactivity']
+        agent_list = []
+        for sex, age, imd, levels in zip(columns['sex'].tolist(), columns['age'].tolist(), columns['imd'].tolist(), \
+            columns['levels'].tolist()):
+            sex = parameters.SEXES[sex]
+            agent_list.append(Agent(sex, age, self.param.pick_risk_factors(sex), dict(zip(keys, levels)), len(agent_list)))
+            agent_list[-1].imd = imd
+        for i, j in enumerate(columns['spouse'].tolist()):
+            if j >= 0:
+                agent_list[i].spouse = agent_list[j]
+        # household lists hold every other member of the household except the spouse
+        household = columns['household']
+        for a, household_id in zip(agent_list, household.tolist()):
+            a.household_id = household_id
+        bounds = np.flatnonzero(np.diff(household)) + 1
+        for start, end in zip(np.r_[0, bounds].tolist(), np.r_[bounds, len(household)].tolist()):
+            members = agent_list[start:end]
+            for a in members:
+                a.household = [m for m in members if m is not a and m is not a.spouse]
+        remaining_agents = []
+        for i in np.flatnonzero(columns['employed']).tolist():
+            agent_list[i].assign_to_workplace = True
+            remaining_agents.append(agent_list[i])
+        return agent_list, remaining_agents
+
+
+    # carve the employed agents (rows of agent_list) into workplaces
+    # the pool is shuffled once and then split into consecutive blocks, so each workplace
+    # is a uniform random sample of the employed agents (as with repeated random.choice)
+    # but the whole stage is linear in the number of employees
+    # related holds the sorted pair keys (see pair_keys) of agents related more closely, who are
+    # left out of each other's workplace lists
+    # the shuffle and workplaces are drawn from the random module, or from rng if given
+    def assign_workplaces(self, agent_list, employed, related, rng=None):
+        if rng is None:
+            pool = list(employed)
+            random.shuffle(pool)
+        else:
+            pool = rng.permutation(np.array(employed, dtype=np.int64)).tolist()
+        draws = self.workplace_draws(rng)
+        workplace = np.full(len(agent_list), -1, dtype=np.int32)
+        start = 0
+        workplace_id = 0
+        while start < len(pool):
+            # a workplace is the first agent plus a target number of colleagues; if fewer
+            # agents than the target size remain, they are all added to the final workplace
+            workplace_size, wtype = next(draws)
+            wplace = pool[start:start + 1 + workplace_size]
+            start += 1 + workplace_size
             # set the workplace of each agent
-            for employee in wplace:
-                employee.workplace = wplace.copy()
+            for i in wplace:
+                employee = agent_list[i]
                 employee.workplace_type = wtype
+                employee.workplace_id = workplace_id
                 employee.assign_to_workplace = False
-                # remove self from workplace record
-                employee.workplace.remove(employee)
-                # remove spouse from workplace record (since relationships hierarchical)
-                if employee.spouse in employee.workplace:
-                    employee.workplace.remove(employee.spouse)
-                # remove agents in household from the workplace (since relationships hierarchical)
-                for colleague in employee.workplace:
-                    if colleague in employee.household:
-                        employee.workplace.remove(colleague)
-
-                # remove agents in friends from the workplace (since relationships hierarchical)
-                if graph.has_node(employee):
-                    for colleague in employee.workplace:
-                        if graph.has_node(colleague):
-                            if graph.has_edge(employee, colleague):
-                                employee.workplace.remove(colleague)      
-
-        # use the friendship network to set the friend list for each agent
-        for a in agent_list:
-            if graph.has_node(a):
-                for n in graph.neighbors(a):
-                    a.friends.append(n)
-        # try to force garbage collection on the graph
-        del graph
-        gc.collect
-
-        # uncomment the following to also return the friendship graph; also need to
-        # comment out the garbage collection above
-        # return agent_list, graph
-        return agent_list
+            workplace[wplace] = workplace_id
+            workplace_id += 1
+        # colleagues exclude self, spouse, household members and friends (since relationships hierarchical)
+        # only related pairs in the same workplace can match, so the rest are dropped before the merge
+        n = len(agent_list)
+        first, second = related // n, related % n
+        related = related[(workplace[first] == workplace[second]) & (workplace[first] >= 0)]
+        u, v = group_pairs(np.array(pool, dtype=np.int32), workplace)
+        u, v = remove_pairs(u, v, n, related)
+        set_relationship_lists(agent_list, u, v, 'workplace')
+
+
+    # (contacts size, type) of successive workplaces, from the random module or, given rng, drawn from it in
+    # blocks (see draw_workplaces)
+    def workplace_draws(self, rng=None):
+        while True:
+            if rng is None:
+                yield self.param.pick_workplace_contacts_size(), self.param.pick_workplace_type()
+            else:
+                contacts, wtype = self.draw_workplaces(1000, rng)
+                yield from zip(contacts.tolist(), wtype.tolist())
+
+
+    # emit each relationship layer of a generated population as CSR adjacency
+    # rows and neighbour indices are positions in agent_list; the workplace layer also records
+    # the workplace type of the receiving agent on each edge
+    # returns a dict keyed by relationship (see RELATIONSHIPS)
+    # relationships restricts the layers built (e.g. to skip the household and workplace cliques)
+    @staticmethod
+    def relationship_layers(agent_list, relationships=RELATIONSHIPS):
+        row = {a.id: i for i, a in enumerate(agent_list)}
+        def rows_of(agents):
+            return [row[a.id] for a in agents]
+        layers = dict()
+        if 'Spouse' in relationships:
+            layers['Spouse'] = CSR.from_lists([[] if a.spouse is None else [row[a.spouse.id]] for a in agent_list])
+        if 'Household' in relationships:
+            layers['Household'] = CSR.from_lists([rows_of(a.household) for a in agent_list])
+        if 'Friendship' in relationships:
+            layers['Friendship'] = CSR.from_lists([rows_of(a.friends) for a in agent_list])
+        if 'Workplace' in relationships:
+            layers['Workplace'] = CSR.from_lists([rows_of(a.workplace) for a in agent_list], \
+                edge_type=[0 if a.workplace_type is None else a.workplace_type for a in agent_list])
+        return layers
+
+
+    # id of each agent's group of household members sharing its workplace (-1 without a workplace)
+    # household and workplace are the group id columns of an AgentTable
+    @staticmethod
+    def joint_groups(household, workplace):
+        joint = np.full(len(household), -1, dtype=np.int32)
+        worker = workplace >= 0
+        key = household[worker].astype(np.int64) * (int(workplace.max()) + 1) + workplace[worker]
+        joint[worker] = np.unique(key, return_inverse=True)[1]
+        return joint
+
+
+    # the household and workplace lists of an agent are its household or workplace minus the members
+    # it is related to more closely (relationships are hierarchical): a household excludes the spouse and
+    # a workplace the spouse, household members (see joint_groups) and friends
+    # returns, for each, the CSR pairs of the spouse and friendship layers that fall inside the same group
+    @staticmethod
+    def group_exclusions(layers, household, workplace):
+        spouse, friends = layers['Spouse'], layers['Friendship']
+        same_household = household[spouse.rows()] == household[spouse.indices]
+        same_workplace = (workplace[friends.rows()] == workplace[friends.indices]) & (workplace[friends.indices] >= 0)
+        return {'Household': spouse.select(same_household), 'Workplace': friends.select(same_workplace)}
+
+
+    # reorder the rows of an AgentTable and its dict of CSR layers by a permutation (see locality_order),
+    # returning the new table and layers; households are renumbered in order of their first row, so that
+    # the household totals are read in order too
+    # the id column moves with the rows, so table.id maps each new row back to the agent's original id
+    @staticmethod
+    def reorder(table, layers, order):
+        table = table.take(order)
+        first = np.r_[True, table.household[1:] != table.household[:-1]]
+        table.household = np.where(table.household >= 0, np.cumsum(first) - 1, -1).astype(np.int32)
+        return table, {rel: layer.permute(order) for rel, layer in layers.items()}
 
 
     # print a list of agents, can be useful for debugging
@@ -240,6 +778,15 @@ class Network:
 				
  
 # main method for testing the network
+# whether two generated populations are the same: each agent's attributes and the rows of its related agents
+def same_population(agent_list, other_list):
+    def describe(a):
+        return (a.sex, a.age, a.imd, a.threshold, a.household_id, a.workplace_id, a.workplace_type,
+            a.spouse.id if a.spouse is not None else None, [b.id for b in a.household], [b.id for b in a.friends],
+            [b.id for b in a.workplace])
+    return len(agent_list) == len(other_list) and all(describe(a) == describe(b) for a, b in zip(agent_list, other_list))
+
+
 def main():
     parser = argparse.ArgumentParser(description="network - create a network for CVD simulation.")
     # main simulation parameters
@@ -249,6 +796,13 @@ def main():
         default=3500, type=int, help='target population size')
     parser.add_argument('--plots', dest='plots', \
                         action='store_true', help='generate basic plots')
+    parser.add_argument('--batch', dest='batch', \
+                        action='store_true', help='synthesise households with vectorised batch sampling')
+    parser.add_argument('--shards', action='store', default=None, type=int,
+                        help='synthesise households as this many shards on a pool of processes')
+    parser.add_argument('--seed', action='store', default=None, type=int, help='seed of a sharded population')
+    parser.add_argument('--check-seed', dest='check_seed', action='store_true',
+                        help='with --shards, generate the population twice and check that the two are the same')
     parser.set_defaults(plots=False)
     args = parser.parse_args()
     print("Using parameters from folder:", args.parameter_folder)
@@ -263,8 +817,16 @@ def main():
     if not plots:
         mpl.use('PDF')
 
-    agent_list = n.generate_agents(target_size)
+    agent_list = n.generate_agents(target_size, batch=args.batch, shards=args.shards, seed=args.seed)
     print("Number of agents in population:", len(agent_list))
+    if args.check_seed:
+        if args.shards is None:
+            print("Error: checking the seed requires --shards")
+            exit(1)
+        same = same_population(agent_list, n.generate_agents(target_size, shards=args.shards, seed=args.seed))
+        print("Same population from the same seed and shards:", same)
+        if not same:
+            exit(1)
     # to use the following need to return agent_list and graph from generate_agents()
     # which uses significantly more memory
     # print("Number of edges in the friendship network:", nx.number_of_edges(graph))
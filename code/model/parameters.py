@@ -1,8 +1,264 @@
 import random
 import math
+import copy
+from bisect import bisect_left
+import itertools
 import numpy as np
 import csv
 import os
+import pickle
+import hashlib
+from agent import qrisk3, qrisk3_male, qrisk3_female
+
+# index order used by the dense lookup tables (sex 0 = male, 1 = female)
+SEXES = ['M', 'F']
+AGE_BANDS = ['18-34', '35-64', '65+']
+BEHAVIOURS = ['Smoking', 'Alcohol', 'Diet', 'Inactivity']
+# relationships, in order of precedence (the keys of Parameters.inf_by_rel and first axis of influence arrays)
+RELATIONSHIPS = ['Spouse', 'Household', 'Friendship', 'Workplace']
+
+
+# index of the behaviour prevalence / risk age band for an age (or array of ages)
+def age_band(age):
+    return np.digitize(age, [35, 65])
+
+
+# draw one category per sample from a stack of cumulative distributions
+# cdf has shape (rows, categories) with each row ending at 1, rows selects the row for each sample
+# and u holds uniform draws; returns the first category whose cumulative probability reaches u,
+# which is the same category the scalar samplers pick by walking the distribution
+def sample_rows(cdf, rows, u):
+    n_cat = cdf.shape[1]
+    offset = np.arange(cdf.shape[0]) * 2.0
+    flat = (cdf + offset[:, None]).ravel()
+    index = np.searchsorted(flat, u + offset[rows], side='left')
+    return np.minimum(index - rows * n_cat, n_cat - 1)
+
+
+# oldest age covered by the annual CVD probability table (older agents use the last row)
+CVD_TABLE_MAX_AGE = 120
+
+
+# build the table of CVD risk multipliers for the behaviour levels
+# indexed [sex, age band, smoking, alcohol, diet, inactivity level]; risk_factors maps 'M'/'F' to the
+# behaviour CVD risk dict ([age band][behaviour][level]) used by Agent.test_for_cv
+def cvd_risk_multiplier_table(risk_factors):
+    table = np.ones((len(SEXES), len(AGE_BANDS)) + (3,) * len(BEHAVIOURS))
+    for s, sex in enumerate(SEXES):
+        for a, band in enumerate(AGE_BANDS):
+            for b, bhvr in enumerate(BEHAVIOURS):
+                shape = [1] * len(BEHAVIOURS)
+                shape[b] = 3
+                table[s, a] *= np.array([risk_factors[sex][band][bhvr][l] for l in range(3)]).reshape(shape)
+    return table
+
+
+# build the table of annual CVD probabilities under the default QRISK3 covariates
+# indexed [sex, age, smoking, alcohol, diet, inactivity level] for ages 0 to CVD_TABLE_MAX_AGE,
+# where ages below min_age use the row for min_age
+def cvd_probability_table(risk_factors, min_age):
+    multiplier = cvd_risk_multiplier_table(risk_factors)
+    ages = np.maximum(np.arange(CVD_TABLE_MAX_AGE + 1), min_age)
+    # the ten year chance is assumed to be spread uniformly over the years
+    base = np.array([qrisk3_male(ages.astype(np.float64)), qrisk3_female(ages.astype(np.float64))]) / 10.0
+    bands = age_band(ages)
+    return base[:, :, None, None, None, None] * multiplier[:, bands]
+
+
+# annual CVD probability for each agent from per-agent QRISK3 covariate arrays
+# (see agent.qrisk3; covariates maps covariate name to array) and a cvd_risk_multiplier_table
+def cvd_probability_with_covariates(multiplier, sex, age, levels, covariates):
+    base = qrisk3(sex, age, **covariates) / 10.0
+    return base * multiplier[sex, age_band(age), levels[:, 0], levels[:, 1], levels[:, 2], levels[:, 3]]
+
+
+# look up the annual CVD probability for each agent from a cvd_probability_table
+# sex uses the SEXES index and levels is an (n, 4) array in BEHAVIOURS order
+def cvd_probability(table, sex, age, levels):
+    age = np.minimum(age, table.shape[1] - 1)
+    return table[sex, age, levels[:, 0], levels[:, 1], levels[:, 2], levels[:, 3]]
+
+
+# turn probabilities along the last axis into normalised cumulative distributions
+def to_cdf(p):
+    cdf = np.cumsum(p, axis=-1)
+    return cdf / cdf[..., -1:]
+
+
+# convert an inf_by_rel dict into a dense array of shape (relationship, workplace type, behaviour, level)
+# using the RELATIONSHIPS and BEHAVIOURS orders; workplace type 0 (no workplace) has no influence
+# and the non-workplace relationships are repeated across the workplace type axis
+def influence_array(inf_by_rel):
+    n_types = max(inf_by_rel['Workplace'].keys()) + 1
+    weights = np.zeros((len(RELATIONSHIPS), n_types, len(BEHAVIOURS), 3))
+    for r, rel in enumerate(RELATIONSHIPS):
+        for t in range(n_types):
+            if rel == 'Workplace':
+                if t not in inf_by_rel[rel]:
+                    continue
+                table = inf_by_rel[rel][t]
+            else:
+                table = inf_by_rel[rel]
+            for b, bhvr in enumerate(BEHAVIOURS):
+                weights[r, t, b] = [table[bhvr][l] for l in range(3)]
+    return weights
+
+
+# convert an influence array back into an inf_by_rel dict (with workplace types 1 to the last), e.g. for the
+# loop engine; the non-workplace relationships take their influence from workplace type 0
+def influence_dict(weights):
+    def levels(w):
+        return {bhvr: {l: float(w[b, l]) for l in range(3)} for b, bhvr in enumerate(BEHAVIOURS)}
+    inf_by_rel = {rel: levels(weights[r, 0]) for r, rel in enumerate(RELATIONSHIPS) if rel != 'Workplace'}
+    inf_by_rel['Workplace'] = {t: levels(weights[RELATIONSHIPS.index('Workplace'), t]) for t in range(1, weights.shape[1])}
+    return inf_by_rel
+
+
+# new influence array with the influence of the given relationships and behaviours (names from RELATIONSHIPS
+# and BEHAVIOURS) at the given levels set to value, which may be an array broadcasting to the selected
+# cells, of shape (relationship, workplace type, behaviour, level); None selects every relationship,
+# behaviour or level, and workplace_types optionally restricts the workplace types (of every selected
+# relationship) to set
+# scenario variants are derived from the base array (see Parameters.get_influence) this way, without
+# changing it; as in influence_array, workplace type 0 (no workplace) keeps no workplace influence
+def set_influence(weights, value, relationships=None, behaviours=None, levels=None, workplace_types=None):
+    weights = weights.copy()
+    r = np.arange(len(RELATIONSHIPS)) if relationships is None else [RELATIONSHIPS.index(rel) for rel in relationships]
+    t = np.arange(weights.shape[1]) if workplace_types is None else workplace_types
+    b = np.arange(len(BEHAVIOURS)) if behaviours is None else [BEHAVIOURS.index(bhvr) for bhvr in behaviours]
+    l = np.arange(3) if levels is None else levels
+    weights[np.ix_(r, t, b, l)] = value
+    weights[RELATIONSHIPS.index('Workplace'), 0] = 0.0
+    return weights
+
+
+# influence arrays resolved from overlays in this process, keyed by InfluenceOverlay.key
+resolved_influences = dict()
+
+
+# a scenario's influences, recorded as only the cells it overrides on top of a base influence array (see
+# Parameters.get_influence), which every overlay on it shares and none changes; set returns a new overlay, so
+# scenarios derived from one another (or from the same base) never see each other's changes
+class InfluenceOverlay:
+    def __init__(self, base, cells=None):
+        self.base = base
+        # overridden cells, (relationship, workplace type, behaviour, level) index -> influence
+        self.cells = dict() if cells is None else dict(cells)
+
+    # new overlay with the cells selected as by set_influence (on top of this overlay) also set to value
+    def set(self, value, relationships=None, behaviours=None, levels=None, workplace_types=None):
+        selected = set_influence(np.zeros(self.base.shape, dtype=bool), True, relationships, behaviours, levels,
+                                 workplace_types)
+        values = set_influence(self.base, value, relationships, behaviours, levels, workplace_types)
+        cells = dict(self.cells)
+        cells.update((tuple(idx), float(values[tuple(idx)])) for idx in np.argwhere(selected).tolist())
+        return InfluenceOverlay(self.base, cells)
+
+    # influence of a relationship (and workplace type) on a behaviour level under the overlay, e.g. to derive
+    # an override from another relationship's influence
+    def get(self, relationship, behaviour, level, workplace_type=0):
+        idx = (RELATIONSHIPS.index(relationship), workplace_type, BEHAVIOURS.index(behaviour), level)
+        return self.cells.get(idx, float(self.base[idx]))
+
+    # hash of the base array and the overridden cells, identifying the resolved array
+    def key(self):
+        digest = hashlib.sha256(self.base.tobytes())
+        digest.update(repr((self.base.shape, sorted(self.cells.items()))).encode())
+        return digest.hexdigest()[:24]
+
+    # the overlay as a dense, read-only influence array (as taken by the engines), built once per process
+    # and shared by every overlay with the same key
+    def resolve(self):
+        key = self.key()
+        if key not in resolved_influences:
+            weights = self.base.copy()
+            for idx, value in self.cells.items():
+                weights[idx] = value
+            weights.flags.writeable = False
+            resolved_influences[key] = weights
+        return resolved_influences[key]
+
+
+# running sums of a sequence of probabilities as a list, summed in order as by walking the distribution
+# (so each sum is the same float as the walk's threshold); bisect_left(cum, r) then finds the category a
+# uniform draw r picks, the first whose cumulative probability reaches r, without walking the distribution
+# the last sum is replaced by infinity, so a draw above the total (which may fall short of 1 within the
+# tolerance) picks the last category
+def cumulative(p):
+    cum = list(itertools.accumulate(float(x) for x in p))
+    cum[-1] = math.inf
+    return cum
+
+
+# version of the compiled parameter bundle (the attributes of Parameters), part of the bundle key so bundles
+# compiled by an older version are not reused; bump it when the attributes set by Parameters change
+BUNDLE_FORMAT = 2
+
+# source files of the code that compiles the bundle (the tables built by Parameters, e.g. by compile_tables,
+# cvd_probability_table and the qrisk3 functions), whose contents are part of the bundle key so that a
+# change to that code is never hidden by a bundle compiled before it
+BUNDLE_SOURCES = ['parameters.py', 'agent.py']
+
+# compiled parameter bundles (pickled Parameters) loaded in this process, keyed by bundle_key
+loaded_bundles = dict()
+
+
+# hash of the contents of every file in a parameter folder (so editing a parameter invalidates the cache)
+def parameter_hash(parameter_folder):
+    digest = hashlib.sha256()
+    folder = os.path.join(os.path.curdir, parameter_folder)
+    for name in sorted(os.listdir(folder)):
+        path = os.path.join(folder, name)
+        if os.path.isfile(path):
+            digest.update(name.encode())
+            with open(path, 'rb') as file:
+                digest.update(file.read())
+    return digest.hexdigest()
+
+
+# hash of the contents of source files alongside this module (by default the BUNDLE_SOURCES)
+def source_hash(sources=BUNDLE_SOURCES):
+    digest = hashlib.sha256()
+    for name in sources:
+        digest.update(name.encode())
+        with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), name), 'rb') as file:
+            digest.update(file.read())
+    return digest.hexdigest()
+
+
+# key of the compiled bundle of a parameter folder
+def bundle_key(parameter_folder):
+    key = "|".join([parameter_hash(parameter_folder), source_hash(), str(BUNDLE_FORMAT)])
+    return hashlib.sha256(key.encode()).hexdigest()[:24]
+
+
+# load the parameters in a folder from their compiled bundle, the pickled Parameters object, which is kept
+# for the rest of the process and, if bundle_folder is given, saved in it; only the first load of a folder's
+# contents reads and validates its CSV files, later loads (in this process, or in another using the same
+# bundle_folder) unpickle the bundle
+# bundles are unpickled as found, so bundle_folder must only hold bundles saved here
+# each call returns a new Parameters object, so changes made to one (e.g. to its influences) are not seen by
+# the others
+def load_parameters(parameter_folder, bundle_folder=None):
+    key = bundle_key(parameter_folder)
+    if key not in loaded_bundles:
+        path = None if bundle_folder is None else os.path.join(bundle_folder, key + '.pkl')
+        if path is not None and os.path.exists(path):
+            with open(path, 'rb') as file:
+                loaded_bundles[key] = file.read()
+        else:
+            loaded_bundles[key] = pickle.dumps(Parameters(parameter_folder), protocol=pickle.HIGHEST_PROTOCOL)
+            if path is not None:
+                # write to a temporary file first, so an interrupted save never leaves a partial bundle
+                os.makedirs(bundle_folder, exist_ok=True)
+                with open(path + '.tmp', 'wb') as file:
+                    file.write(loaded_bundles[key])
+                os.replace(path + '.tmp', path)
+    param = pickle.loads(loaded_bundles[key])
+    # the same contents may be in another folder
+    param.parameter_folder = parameter_folder
+    return param
+
 
 class Parameters:
     def __init__(self, parameter_folder) -> None:
@@ -349,23 +605,79 @@ class Parameters:
                     print("Error reading in network parameters: unknown topology (" + row['Topology'] + "). Parameter file:", network_file)
                     exit(1)
 
+        # compile the dense lookup tables used for batch sampling
+        self.compile_tables()
+
+
+    # build NumPy versions of the population distributions, indexed by sex (see SEXES),
+    # age offset (age - min_age), IMD quintile offset (imd - 1) and age band (see AGE_BANDS)
+    def compile_tables(self):
+        ages = range(self.min_age, self.max_age + 1)
+        self.n_ages = len(ages)
+        self.age_cdf = to_cdf(np.array([[self.p_male_age[a] for a in ages], [self.p_female_age[a] for a in ages]]))
+        # spouse ages are indexed by the spouse's sex and the first household member's age
+        self.spouse_age_cdf = to_cdf(np.array([
+            [[self.p_male_spouse_age[a][str(s)] for s in ages] for a in ages],
+            [[self.p_female_spouse_age[a][str(s)] for s in ages] for a in ages]]))
+        self.p_married_table = np.array([[self.p_married[s][str(a)] for a in ages] for s in SEXES])
+        # household sizes are indexed by married (0 = no, 1 = yes) and age; category i is size i + 1
+        sizes = list(self.p_household_married[str(self.min_age)].keys())
+        self.household_size_cdf = to_cdf(np.array([
+            [[float(self.p_household_unmarried[str(a)][s]) for s in sizes] for a in ages],
+            [[float(self.p_household_married[str(a)][s]) for s in sizes] for a in ages]]))
+        imds = ['IMD-' + str(i) for i in range(1, 6)]
+        self.quintile_cdf = to_cdf(np.array([
+            [[float(self.p_male_quintile[str(a)][q]) for q in imds] for a in ages],
+            [[float(self.p_female_quintile[str(a)][q]) for q in imds] for a in ages]]))
+        self.employed_table = np.array([
+            [[float(self.p_male_employed[q][str(a)]) for a in ages] for q in imds],
+            [[float(self.p_female_employed[q][str(a)]) for a in ages] for q in imds]])
+        # initial behaviour levels are indexed by sex, age band and behaviour
+        self.prevalence_cdf = to_cdf(np.array([
+            [[[self.behaviour_prevalence[gen][band][b][l] for l in range(3)] for b in BEHAVIOURS] for band in AGE_BANDS]
+            for gen in ['Male', 'Female']]))
+        # workplace size bands (see pick_workplace_size) with the mean number of contacts in each,
+        # and the workplace types with their distribution
+        bands = list(self.p_workplace_size.keys())
+        self.workplace_size_cdf = to_cdf(np.array([[float(self.p_workplace_size[b]) for b in bands]]))
+        self.workplace_contacts_loc = np.array([int(self.p_workplace_contacts_size[b]) for b in bands])
+        self.workplace_types = np.array(list(self.p_workplace_type_distribution.keys()), dtype=np.int8)
+        self.workplace_type_cdf = to_cdf(np.array([[float(p) for p in self.p_workplace_type_distribution.values()]]))
+        # influence of each relationship (and workplace type) on each behaviour level, as read from the files
+        # (see get_influence)
+        self.influence = influence_array(self.inf_by_rel)
+        self.influence.flags.writeable = False
+        # annual CVD probability by sex, age and behaviour levels
+        self.cvd_table = cvd_probability_table({s: self.pick_risk_factors(s) for s in SEXES}, self.min_age)
+        # behaviour risk multipliers by sex and age band, used with per-agent QRISK3 covariates
+        self.cvd_multiplier = cvd_risk_multiplier_table({s: self.pick_risk_factors(s) for s in SEXES})
+
+        # cumulative probability lists for the scalar samplers (see cumulative), with the same indices as
+        # the tables above; each draw bisects a list rather than walking the distribution's string keys
+        self.age_cum = [cumulative(self.p_male_age[a] for a in ages), cumulative(self.p_female_age[a] for a in ages)]
+        self.spouse_age_cum = [[cumulative(self.p_male_spouse_age[a][str(s)] for s in ages) for a in ages],
+            [cumulative(self.p_female_spouse_age[a][str(s)] for s in ages) for a in ages]]
+        self.household_size_cum = [[cumulative(self.p_household_unmarried[str(a)][s] for s in sizes) for a in ages],
+            [cumulative(self.p_household_married[str(a)][s] for s in sizes) for a in ages]]
+        self.quintile_cum = [[cumulative(self.p_male_quintile[str(a)][q] for q in imds) for a in ages],
+            [cumulative(self.p_female_quintile[str(a)][q] for q in imds) for a in ages]]
+        self.employed_list = self.employed_table.tolist()
+        self.prevalence_cum = [[[cumulative(self.behaviour_prevalence[gen][band][b][l] for l in range(3)) for b in BEHAVIOURS] \
+            for band in AGE_BANDS] for gen in ['Male', 'Female']]
+        self.workplace_size_cum = cumulative(self.p_workplace_size[b] for b in bands)
+        self.workplace_type_cum = cumulative(self.p_workplace_type_distribution.values())
+        self.workplace_type_list = self.workplace_types.tolist()
+
 
     # pick sex and age for a new agent (i.e., first agent in a household)
     def pick_sex_age(self):
-        index = 0
         r = random.uniform(0,1)
         if random.random() < self.p_male:
             sex = 'M'
-            threshold = self.p_male_age[self.min_age]
-            while r > threshold:
-                index += 1
-                threshold += self.p_male_age[self.min_age + index]
+            index = bisect_left(self.age_cum[0], r)
         else:
             sex = 'F'
-            threshold = self.p_female_age[self.min_age]
-            while r > threshold:
-                index += 1
-                threshold += self.p_female_age[self.min_age + index] 
+            index = bisect_left(self.age_cum[1], r)
         return sex, self.min_age + index
 
 
@@ -377,18 +689,8 @@ class Parameters:
             sex = 'M'
         else:
             sex = 'F'
-        index = 0
         r = random.uniform(0,1)
-        if sex == 'M':
-            threshold = self.p_male_spouse_age[spouse_age][str(self.min_age)]
-            while r > threshold:
-                index += 1
-                threshold += self.p_male_spouse_age[spouse_age][str(self.min_age + index)]
-        else:
-            threshold = self.p_female_spouse_age[spouse_age][str(self.min_age)]
-            while r > threshold:
-                index += 1
-                threshold += self.p_female_spouse_age[spouse_age][str(self.min_age + index)]
+        index = bisect_left(self.spouse_age_cum[0 if sex == 'M' else 1][spouse_age - self.min_age], r)
         return sex, self.min_age + index
 
 
@@ -399,44 +701,21 @@ class Parameters:
 
     # pick a household size
     def pick_household_size(self, first_member_age, first_member_married):
-        index = 1
         r = random.uniform(0,1)
-        if first_member_married == True:
-            threshold = float(self.p_household_married[str(first_member_age)][str(index)])
-            while r > threshold:
-                index += 1
-                threshold += float(self.p_household_married[str(first_member_age)][str(index)])
-        else:
-            threshold = float(self.p_household_unmarried[str(first_member_age)][str(index)])
-            while r > threshold:
-                index += 1
-                threshold += float(self.p_household_unmarried[str(first_member_age)][str(index)])
-        return index
+        married = 1 if first_member_married == True else 0
+        return 1 + bisect_left(self.household_size_cum[married][first_member_age - self.min_age], r)
 
 
     # pick the IMD for a household based on the initial household member
     def pick_household_imd(self, first_member_sex, first_member_age):
         r = random.uniform(0,1)
-        index = 1
-        if first_member_sex == 'M':
-            threshold = float(self.p_male_quintile[str(first_member_age)]['IMD-1'])
-            while r > threshold:
-                index += 1
-                threshold += float(self.p_male_quintile[str(first_member_age)][('IMD-' + str(index))])
-        else:
-            threshold = float(self.p_female_quintile[str(first_member_age)]['IMD-1'])
-            while r > threshold:
-                index += 1
-                threshold += float(self.p_female_quintile[str(first_member_age)][('IMD-' + str(index))])
-        return index    
+        sex = 0 if first_member_sex == 'M' else 1
+        return 1 + bisect_left(self.quintile_cum[sex][first_member_age - self.min_age], r)
 
 
     # return the probability of being employed based on sex, age, and imd
     def work_probability(self, sex, age, imd):
-        if sex == 'M':
-            return float(self.p_male_employed[('IMD-' + str(imd))][str(age)])
-        else:
-            return float(self.p_female_employed[('IMD-' + str(imd))][str(age)])
+        return self.employed_list[0 if sex == 'M' else 1][imd - 1][age - self.min_age]
 
 
     # pick a workplace size according to defined bins
@@ -446,12 +725,8 @@ class Parameters:
         if sizes != ['<10', '<50', '<250', '250+']:
             print("Error in pick_workplace_size(): workplaces sizes do not match expected categories ('<10', '<50', '<250', '250+').")
             exit(1)
-        index = 0
         r = random.uniform(0,1)
-        threshold = float(self.p_workplace_size[sizes[index]])
-        while r > threshold:
-            index += 1
-            threshold += float(self.p_workplace_size[sizes[index]])
+        index = bisect_left(self.workplace_size_cum, r)
         if index == 0:
             size = random.randint(1,9)
         elif index == 1: 
@@ -510,12 +785,7 @@ class Parameters:
     # pick the workplace type
     def pick_workplace_type(self):
         r = random.uniform(0,1)
-        index = 1
-        threshold = float(self.p_workplace_type_distribution[1])
-        while r > threshold:
-            index += 1
-            threshold += float(self.p_workplace_type_distribution[index])
-        return index
+        return self.workplace_type_list[bisect_left(self.workplace_type_cum, r)]
 
 
     # pick risk factors depending on sex
@@ -540,30 +810,109 @@ class Parameters:
 
 
     # pick the initial risk levels for an agent
+    # (each level is picked as by pick_level, from the compiled prevalence_cum lists)
     def pick_initial_levels(self, sex, age):
         
         if age < 35:
-            age_str = '18-34'
+            band = 0
         elif age < 65:
-            age_str = '35-64'
+            band = 1
         else:
-            age_str = '65+'
+            band = 2
 
-        if sex == 'M':
-            gen = 'Male'
-        else:
-            gen = 'Female'
+        prevalence = self.prevalence_cum[0 if sex == 'M' else 1][band]
 
         initial_levels = dict()
-        initial_levels['smoking'] = self.pick_level(self.behaviour_prevalence[gen][age_str]['Smoking'])
-        initial_levels['alcohol'] = self.pick_level(self.behaviour_prevalence[gen][age_str]['Alcohol'])
-        initial_levels['diet'] = self.pick_level(self.behaviour_prevalence[gen][age_str]['Diet'])
-        initial_levels['inactivity'] = self.pick_level(self.behaviour_prevalence[gen][age_str]['Inactivity'])
+        initial_levels['smoking'] = bisect_left(prevalence[0], random.uniform(0,1))
+        initial_levels['alcohol'] = bisect_left(prevalence[1], random.uniform(0,1))
+        initial_levels['diet'] = bisect_left(prevalence[2], random.uniform(0,1))
+        initial_levels['inactivity'] = bisect_left(prevalence[3], random.uniform(0,1))
 
         return initial_levels
 
+    ## Batch samplers ##
+    # array counterparts of the scalar samplers above, drawing from the dense tables of compile_tables with
+    # the numpy Generator rng; sexes are SEXES indices (0 = male, 1 = female), ages are whole years between
+    # min_age and max_age and IMD quintiles run from 1 to 5, all as integer arrays of one value per sample
+
+
+    # sex and age for n agents from the whole population distribution (see pick_sex_age)
+    def sample_sex_age(self, n, rng):
+        sex = (rng.random(n) >= self.p_male).astype(np.int8)
+        age = self.min_age + sample_rows(self.age_cdf, sex, rng.random(n))
+        return sex, age.astype(np.int16)
+
+
+    # IMD quintile of a household for each first member (see pick_household_imd)
+    def sample_household_imd(self, sex, age, rng):
+        rows = sex * self.n_ages + (age - self.min_age)
+        return (1 + sample_rows(self.quintile_cdf.reshape(-1, 5), rows, rng.random(len(rows)))).astype(np.int8)
+
+
+    # whether each agent is married (see p_married)
+    def sample_married(self, sex, age, rng):
+        return rng.random(len(sex)) < self.p_married_table[sex, age - self.min_age]
+
+
+    # sex and age of the spouse of each agent (see pick_spouse_sex_age)
+    def sample_spouse(self, sex, age, rng):
+        # spouses are the same sex with probability p_same_sex, otherwise the opposite sex
+        spouse_sex = np.where(rng.random(len(sex)) < self.p_same_sex, sex, 1 - sex).astype(np.int8)
+        rows = spouse_sex * self.n_ages + (age - self.min_age)
+        spouse_age = self.min_age + sample_rows(self.spouse_age_cdf.reshape(-1, self.n_ages), rows, rng.random(len(rows)))
+        return spouse_sex, spouse_age.astype(np.int16)
+
+
+    # size of the household of each first member, given their age and whether they are married (see
+    # pick_household_size)
+    def sample_household_size(self, age, married, rng):
+        n_sizes = self.household_size_cdf.shape[-1]
+        rows = married * self.n_ages + (age - self.min_age)
+        return 1 + sample_rows(self.household_size_cdf.reshape(-1, n_sizes), rows, rng.random(len(rows)))
+
+
+    # probability of being employed for each agent (see work_probability)
+    def employment_prob(self, sex, age, imd):
+        return self.employed_table[sex, imd - 1, age - self.min_age]
+
+
+    # initial behaviour levels of each agent, as an (n, 4) array in BEHAVIOURS order (see pick_initial_levels)
+    def sample_initial_levels(self, sex, age, rng):
+        rows = (sex * len(AGE_BANDS) + age_band(age))[:, None] * len(BEHAVIOURS) + np.arange(len(BEHAVIOURS))
+        levels = sample_rows(self.prevalence_cdf.reshape(-1, 3), rows.ravel(), rng.random(rows.size))
+        return levels.reshape(len(sex), -1).astype(np.int8)
+
+
+    # number of contacts for n workplaces (see pick_workplace_contacts_size); the number only depends on the
+    # size band of the workplace, so the size itself is not drawn
+    def sample_workplace_contacts_size(self, n, rng):
+        band = sample_rows(self.workplace_size_cdf, np.zeros(n, dtype=np.int64), rng.random(n))
+        contacts = rng.normal(self.workplace_contacts_loc[band], self.p_workplace_contacts_size_spread).astype(np.int64)
+        return np.maximum(contacts, 0)
+
+
+    # type of n workplaces (see pick_workplace_type)
+    def sample_workplace_type(self, n, rng):
+        return self.workplace_types[sample_rows(self.workplace_type_cdf, np.zeros(n, dtype=np.int64), rng.random(n))]
+
+
+    # a copy of the influences read from the files, so scenarios changing it do not change these parameters
+    # (or each other); influence_overlay records such changes without copying the whole table
     def get_inf_by_rel(self):
-        return self.inf_by_rel
+        return copy.deepcopy(self.inf_by_rel)
+
+
+    # the influences as a dense, read-only array of shape (relationship, workplace type, behaviour, level) (see
+    # influence_array), holding the values read from the files (changes to inf_by_rel are not reflected)
+    # scenario variants are new arrays derived from it by set_influence or an overlay; the engines take either form
+    def get_influence(self):
+        return self.influence
+
+
+    # an empty overlay on the influences (see InfluenceOverlay), from which scenarios sharing these parameters
+    # (and their populations) derive their influences
+    def influence_overlay(self):
+        return InfluenceOverlay(self.influence)
 
 
 
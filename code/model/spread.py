@@ -10,12 +10,24 @@ import argparse
 import csv
 from pathlib import Path
 import pickle
+import numpy as np
 import parameters
-from agent import Agent
-from network import Network
+from parameters import influence_array, influence_dict
+from agent import Agent, AgentTable, BEHAVIOUR_COLUMNS, next_levels
+from network import Network, RELATIONSHIPS, locality_order
+
+# engines for computing the incoming influence in Spread_Model.simulation
+# 'loop' walks the relationship lists of every agent, 'matrix' counts the behaviour levels of
+# related agents for all agents at once (along sparse adjacency for spouses and friends, and per
+# group for households and workplaces)
+ENGINES = ['loop', 'matrix']
+
+# fraction of dead agents (tombstones) in the relationship lists and arrays above which they are compacted
+COMPACT_DEAD_FRACTION = 0.05
+
 
 class Spread_Model:
-	def __init__(self, agents, inf_by_rel, base_filename):
+	def __init__(self, agents, inf_by_rel, base_filename, engine='loop', cvd_table=None, covariates=None, ordering=None):
 
 		# get list of agents
 		self.agents = agents
@@ -30,11 +42,45 @@ class Spread_Model:
 		# This would return a double between 0 and 1.
 
 		# get list of influence relationships
-		self.inf_by_rel = inf_by_rel
+		# inf_by_rel may also be a list of such dictionaries (e.g. baseline and intervention influences), in which
+		# case each agent takes its influence from the table selected by agent.intervention (False/0 is the first)
+		if isinstance(inf_by_rel, list):
+			self.inf_tables = inf_by_rel
+		else:
+			self.inf_tables = [inf_by_rel]
+		# each table may also be a dense influence array (see parameters.influence_array)
+		self.inf_tables = [influence_dict(inf) if isinstance(inf, np.ndarray) else inf for inf in self.inf_tables]
+		self.inf_by_rel = self.inf_tables[0]
 
 		# base filename for output
 		self.base_filename = base_filename
 
+		# engine used to compute incoming influence (see ENGINES)
+		if engine not in ENGINES:
+			print("Error: unknown engine " + str(engine) + ", expected one of", ENGINES)
+			exit(1)
+		self.engine = engine
+		# number of dead agents not yet compacted out of the relationship lists and arrays
+		self.dead_count = 0
+		# columns and CSR relationship layers used by the matrix engine (built when the simulation starts)
+		self.table = None
+		self.layers = None
+		# annual CVD probability table used by the matrix engine (see parameters.cvd_probability_table);
+		# if not given it is built from the agents' risk factors
+		self.cvd_table = cvd_table
+		# optional per-agent QRISK3 covariates for the matrix engine: a dict mapping 'bmi', 'rati', 'sbp'
+		# and/or 'sbps5' to arrays aligned with agents (NaN entries use the default for the agent's sex)
+		if covariates is not None and engine != 'matrix':
+			print("Error: per-agent covariates require the matrix engine")
+			exit(1)
+		self.covariates = covariates
+		# optional cache-locality ordering of the matrix engine's rows (see network.ORDERINGS); the agents
+		# keep their order, and rows maps each row back to its agent
+		if ordering is not None and engine != 'matrix':
+			print("Error: ordering the rows requires the matrix engine")
+			exit(1)
+		self.ordering = ordering
+
 		# storing the list of dead agents
 		self.deceased = dict()
 
@@ -140,22 +186,20 @@ class Spread_Model:
 	# Method will remove the agent from our simulation
 	# we store the agent in a list, for use in analysis
 	# we also record some information of the dead agent for later use
+	# the agent is only marked as dead here: it is dropped from the list of agents at the end of the
+	# time step, and from the relationship lists (and the matrix engine's arrays) by compact
 	def agent_death(self, agent, t, cvd_metrics):
-		self.agents.remove(agent)
+		agent.alive = False
+		self.dead_count = self.dead_count + 1
 		self.deceased[t].append(agent)
 
+		# the matrix engine masks dead agents out of the relationship layers
+		if self.table is not None:
+			self.table.alive[self.row[agent.id]] = False
+
 		if agent.spouse is not None:
 			agent.spouse.spouse = None
 
-		for hm in agent.household:
-			hm.household.remove(agent)
-
-		for wm in agent.workplace:
-			wm.workplace.remove(agent)
-
-		for f in agent.friends:
-			f.friends.remove(agent)
-
 		cvd_metrics[agent.sex] = cvd_metrics[agent.sex] + 1
 
 		imd_level = 'imd' + str(agent.imd)
@@ -625,115 +669,10 @@ class Spread_Model:
 
 			self.population = self.population + [len(self.agents)]
 
-			for agent in self.agents:
-
-				# set up data structure to store the incoming influence
-				inc_inf = dict()
-				inc_inf['smoking'] = {0: 0.0, 1: 0.0, 2: 0.0}
-				inc_inf['alcohol'] = {0: 0.0, 1: 0.0, 2: 0.0}
-				inc_inf['diet'] = {0: 0.0, 1: 0.0, 2: 0.0}
-				inc_inf['inactivity'] = {0: 0.0, 1: 0.0, 2: 0.0}
-
-				# check if agent has a spouse and include the
-				# spouse's influence upon the agent
-				if agent.spouse is not None:
-
-					# determine input for smoking
-					inc_inf['smoking'][agent.spouse.smoking_level] = \
-					inc_inf['smoking'][agent.spouse.smoking_level] + \
-					self.inf_by_rel['Spouse']['Smoking'][agent.spouse.smoking_level]
-
-					# determine input for alcohol
-					inc_inf['alcohol'][agent.spouse.alcohol_level] = \
-					inc_inf['alcohol'][agent.spouse.alcohol_level] + \
-					self.inf_by_rel['Spouse']['Alcohol'][agent.spouse.alcohol_level]
-
-					# determine input for diets
-					inc_inf['diet'][agent.spouse.diet_level] = \
-					inc_inf['diet'][agent.spouse.diet_level] + \
-					self.inf_by_rel['Spouse']['Diet'][agent.spouse.diet_level]
-
-					# determine input for inactivity
-					inc_inf['inactivity'][agent.spouse.inactivity_level] = \
-					inc_inf['inactivity'][agent.spouse.inactivity_level] + \
-					self.inf_by_rel['Spouse']['Inactivity'][agent.spouse.inactivity_level]
-
-				# add household influence to incoming influence for agent
-				for hm in agent.household:
-
-					# determine input for smoking
-					inc_inf['smoking'][hm.smoking_level] = \
-					inc_inf['smoking'][hm.smoking_level] + \
-					self.inf_by_rel['Household']['Smoking'][hm.smoking_level]
-
-					# determine input for alcohol
-					inc_inf['alcohol'][hm.alcohol_level] = \
-					inc_inf['alcohol'][hm.alcohol_level] + \
-					self.inf_by_rel['Household']['Alcohol'][hm.alcohol_level]
-
-					# determine input for diets
-					inc_inf['diet'][hm.diet_level] = \
-					inc_inf['diet'][hm.diet_level] + \
-					self.inf_by_rel['Household']['Diet'][hm.diet_level]
-
-					# determine input for inactivity
-					inc_inf['inactivity'][hm.inactivity_level] = \
-					inc_inf['inactivity'][hm.inactivity_level] + \
-					self.inf_by_rel['Household']['Inactivity'][hm.inactivity_level]
-
-				# add household influence to incoming influence for agent
-				for wm in agent.workplace:
-					# determine input for smoking
-					inc_inf['smoking'][wm.smoking_level] = \
-					inc_inf['smoking'][wm.smoking_level] + \
-					self.inf_by_rel['Workplace'][agent.workplace_type]['Smoking'][wm.smoking_level]
-
-					# determine input for alcohol
-					inc_inf['alcohol'][wm.alcohol_level] = \
-					inc_inf['alcohol'][wm.alcohol_level] + \
-					self.inf_by_rel['Workplace'][agent.workplace_type]['Alcohol'][wm.alcohol_level]
-
-					# determine input for diets
-					inc_inf['diet'][wm.diet_level] = \
-					inc_inf['diet'][wm.diet_level] + \
-					self.inf_by_rel['Workplace'][agent.workplace_type]['Diet'][wm.diet_level]
-
-					# determine input for inactivity
-					inc_inf['inactivity'][wm.inactivity_level] = \
-					inc_inf['inactivity'][wm.inactivity_level] + \
-					self.inf_by_rel['Workplace'][agent.workplace_type]['Inactivity'][wm.inactivity_level]
-
-				# add incoming influence for friends in friendship network
-				for friend in agent.friends:
-
-					# determine input for smoking
-					inc_inf['smoking'][friend.smoking_level] = \
-					inc_inf['smoking'][friend.smoking_level] + \
-					self.inf_by_rel['Friendship']['Smoking'][friend.smoking_level]
-
-					# determine input for alcohol
-					inc_inf['alcohol'][friend.alcohol_level] = \
-					inc_inf['alcohol'][friend.alcohol_level] + \
-					self.inf_by_rel['Friendship']['Alcohol'][friend.alcohol_level]
-
-					# determine input for diets
-					inc_inf['diet'][friend.diet_level] = \
-					inc_inf['diet'][friend.diet_level] + \
-					self.inf_by_rel['Friendship']['Diet'][friend.diet_level]
-
-					# determine input for inactivity
-					inc_inf['inactivity'][friend.inactivity_level] = \
-					inc_inf['inactivity'][friend.inactivity_level] + \
-					self.inf_by_rel['Friendship']['Inactivity'][friend.inactivity_level]
-					
-				# Calculate the new level for the agent based on the calculated incoming influence.
-				# These new levels are stored in temporary variables.
-				# We need to shift the levels of all agents at the same time, so save the temporary
-				# values for now and swap them over later. 
-				agent.next_smoking_level(inc_inf['smoking'])
-				agent.next_alcohol_level(inc_inf['alcohol'])
-				agent.next_diet_level(inc_inf['diet'])
-				agent.next_inactivity_level(inc_inf['inactivity'])
+			if self.engine == 'matrix':
+				self.matrix_influence()
+			else:
+				self.loop_influence()
 
 			cvd_metrics = {'M': 0, 'F': 0, 'imd1': 0, 'imd2': 0, 'imd3': 0, 'imd4': 0, 'imd5': 0, 'avg_age': 0}
 			# update agent risk levels and CVD risk.
@@ -741,6 +680,8 @@ class Spread_Model:
 			# suffered a CVD event.
 
 			self.deceased[i] = list()
+			if self.engine == 'matrix':
+				self.matrix_cvd_test()
 			for agent in self.agents:
 				# update tracking of person years for calculating final results
 				if agent.age >= 25:
@@ -772,20 +713,297 @@ class Spread_Model:
 				# update cvd risk, check for cvd events, and increment age
 				agent.update_risk_levels()
 
-				if agent.test_for_cv():
+				if self.test_for_cv(agent):
 					self.agent_death(agent, i, cvd_metrics)
 				else:
 					agent.age_up()
 
+			self.agents = [agent for agent in self.agents if agent.alive]
+			if self.dead_count > COMPACT_DEAD_FRACTION * (len(self.agents) + self.dead_count):
+				self.compact()
+
 			cvd_metrics['avg_age'] = cvd_metrics['avg_age'] / len(self.deceased[i])
 			cvd_metrics['total'] = len(self.deceased[i])
 			self.cvd_demographics.append(cvd_metrics)
 
 			print("Timestep " + str(i) + " finished. Calculating analytics.")
 			self.analytics(i)
+		if self.dead_count > 0:
+			self.compact()
 		print("Finished running simulation.")
 
 
+	# remove dead agents from the relationship lists of the living agents and, for the matrix engine,
+	# from the agent table and relationship layers (renumbering the rows)
+	def compact(self):
+		for agent in self.agents:
+			agent.household = [hm for hm in agent.household if hm.alive]
+			agent.workplace = [wm for wm in agent.workplace if wm.alive]
+			agent.friends = [f for f in agent.friends if f.alive]
+
+		if self.table is not None:
+			keep = self.table.alive.copy()
+			self.table = self.table.take(keep)
+			self.layers = {rel: layer.take(keep) for rel, layer in self.layers.items()}
+			self.exclusions = {rel: layer.take(keep) for rel, layer in self.exclusions.items()}
+			self.joint = Network.joint_groups(self.table.household, self.table.workplace)
+			self.rows = [a for a, k in zip(self.rows, keep.tolist()) if k]
+			self.row = {a.id: i for i, a in enumerate(self.rows)}
+			if self.covariates is not None:
+				self.covariates = {name: value[keep] for name, value in self.covariates.items()}
+		self.dead_count = 0
+
+
+	# compute the incoming influence for each agent from its relationship lists and set its next behaviour levels
+	def loop_influence(self):
+		for agent in self.agents:
+
+			# influence table for the agent's intervention group
+			inf = self.inf_tables[agent.intervention]
+
+			# set up data structure to store the incoming influence
+			inc_inf = dict()
+			inc_inf['smoking'] = {0: 0.0, 1: 0.0, 2: 0.0}
+			inc_inf['alcohol'] = {0: 0.0, 1: 0.0, 2: 0.0}
+			inc_inf['diet'] = {0: 0.0, 1: 0.0, 2: 0.0}
+			inc_inf['inactivity'] = {0: 0.0, 1: 0.0, 2: 0.0}
+
+			# check if agent has a spouse and include the
+			# spouse's influence upon the agent
+			if agent.spouse is not None:
+
+				# determine input for smoking
+				inc_inf['smoking'][agent.spouse.smoking_level] = \
+				inc_inf['smoking'][agent.spouse.smoking_level] + \
+				inf['Spouse']['Smoking'][agent.spouse.smoking_level]
+
+				# determine input for alcohol
+				inc_inf['alcohol'][agent.spouse.alcohol_level] = \
+				inc_inf['alcohol'][agent.spouse.alcohol_level] + \
+				inf['Spouse']['Alcohol'][agent.spouse.alcohol_level]
+
+				# determine input for diets
+				inc_inf['diet'][agent.spouse.diet_level] = \
+				inc_inf['diet'][agent.spouse.diet_level] + \
+				inf['Spouse']['Diet'][agent.spouse.diet_level]
+
+				# determine input for inactivity
+				inc_inf['inactivity'][agent.spouse.inactivity_level] = \
+				inc_inf['inactivity'][agent.spouse.inactivity_level] + \
+				inf['Spouse']['Inactivity'][agent.spouse.inactivity_level]
+
+			# add household influence to incoming influence for agent
+			for hm in agent.household:
+				if not hm.alive:
+					continue
+
+				# determine input for smoking
+				inc_inf['smoking'][hm.smoking_level] = \
+				inc_inf['smoking'][hm.smoking_level] + \
+				inf['Household']['Smoking'][hm.smoking_level]
+
+				# determine input for alcohol
+				inc_inf['alcohol'][hm.alcohol_level] = \
+				inc_inf['alcohol'][hm.alcohol_level] + \
+				inf['Household']['Alcohol'][hm.alcohol_level]
+
+				# determine input for diets
+				inc_inf['diet'][hm.diet_level] = \
+				inc_inf['diet'][hm.diet_level] + \
+				inf['Household']['Diet'][hm.diet_level]
+
+				# determine input for inactivity
+				inc_inf['inactivity'][hm.inactivity_level] = \
+				inc_inf['inactivity'][hm.inactivity_level] + \
+				inf['Household']['Inactivity'][hm.inactivity_level]
+
+			# add household influence to incoming influence for agent
+			for wm in agent.workplace:
+				if not wm.alive:
+					continue
+				# determine input for smoking
+				inc_inf['smoking'][wm.smoking_level] = \
+				inc_inf['smoking'][wm.smoking_level] + \
+				inf['Workplace'][agent.workplace_type]['Smoking'][wm.smoking_level]
+
+				# determine input for alcohol
+				inc_inf['alcohol'][wm.alcohol_level] = \
+				inc_inf['alcohol'][wm.alcohol_level] + \
+				inf['Workplace'][agent.workplace_type]['Alcohol'][wm.alcohol_level]
+
+				# determine input for diets
+				inc_inf['diet'][wm.diet_level] = \
+				inc_inf['diet'][wm.diet_level] + \
+				inf['Workplace'][agent.workplace_type]['Diet'][wm.diet_level]
+
+				# determine input for inactivity
+				inc_inf['inactivity'][wm.inactivity_level] = \
+				inc_inf['inactivity'][wm.inactivity_level] + \
+				inf['Workplace'][agent.workplace_type]['Inactivity'][wm.inactivity_level]
+
+			# add incoming influence for friends in friendship network
+			for friend in agent.friends:
+				if not friend.alive:
+					continue
+
+				# determine input for smoking
+				inc_inf['smoking'][friend.smoking_level] = \
+				inc_inf['smoking'][friend.smoking_level] + \
+				inf['Friendship']['Smoking'][friend.smoking_level]
+
+				# determine input for alcohol
+				inc_inf['alcohol'][friend.alcohol_level] = \
+				inc_inf['alcohol'][friend.alcohol_level] + \
+				inf['Friendship']['Alcohol'][friend.alcohol_level]
+
+				# determine input for diets
+				inc_inf['diet'][friend.diet_level] = \
+				inc_inf['diet'][friend.diet_level] + \
+				inf['Friendship']['Diet'][friend.diet_level]
+
+				# determine input for inactivity
+				inc_inf['inactivity'][friend.inactivity_level] = \
+				inc_inf['inactivity'][friend.inactivity_level] + \
+				inf['Friendship']['Inactivity'][friend.inactivity_level]
+				
+			# Calculate the new level for the agent based on the calculated incoming influence.
+			# These new levels are stored in temporary variables.
+			# We need to shift the levels of all agents at the same time, so save the temporary
+			# values for now and swap them over later. 
+			agent.next_smoking_level(inc_inf['smoking'])
+			agent.next_alcohol_level(inc_inf['alcohol'])
+			agent.next_diet_level(inc_inf['diet'])
+			agent.next_inactivity_level(inc_inf['inactivity'])
+
+	# compute the incoming influence for all agents at once and set their next behaviour levels
+	# for each relationship, the number of living related agents at each level of a behaviour (see
+	# relationship_counts) scaled by the influence of that relationship at each level gives the same
+	# totals as the loop engine
+	def matrix_influence(self):
+		if self.table is None:
+			self.table = AgentTable.from_agents(self.agents)
+			self.row = {a.id: i for i, a in enumerate(self.agents)}
+			self.rows = list(self.agents)
+			# household and workplace influence is computed from per-group counts, so only the spouse and
+			# friendship layers are built, along with the pairs excluded from the groups
+			self.layers = Network.relationship_layers(self.agents, ['Spouse', 'Friendship'])
+			if self.ordering is not None:
+				order = locality_order(self.table.household, self.layers['Friendship'], self.ordering)
+				self.table, self.layers = Network.reorder(self.table, self.layers, order)
+				self.rows = [self.rows[i] for i in order.tolist()]
+				self.row = {a.id: i for i, a in enumerate(self.rows)}
+				if self.covariates is not None:
+					self.covariates = {name: np.asarray(value)[order] for name, value in self.covariates.items()}
+			self.exclusions = Network.group_exclusions(self.layers, self.table.household, self.table.workplace)
+			self.joint = Network.joint_groups(self.table.household, self.table.workplace)
+			# influence tables stacked along a leading axis, indexed by the agents' intervention column
+			self.weights = np.stack([influence_array(inf) for inf in self.inf_tables])
+			# random number generator for the batched level selection, seeded from the random module
+			# so that random.seed() controls both engines
+			self.rng = np.random.default_rng(random.getrandbits(64))
+
+			risk_factors = {a.sex: a.risk_factors for a in self.agents}
+			if self.cvd_table is None and self.covariates is None:
+				self.cvd_table = parameters.cvd_probability_table(risk_factors, min(a.age for a in self.agents))
+			if self.covariates is not None:
+				self.cvd_multiplier = parameters.cvd_risk_multiplier_table(risk_factors)
+				self.covariates = {name: np.asarray(value, dtype=np.float64) for name, value in self.covariates.items()}
+
+		n = len(self.table)
+		for b in BEHAVIOUR_COLUMNS:
+			getattr(self.table, b)[:] = [getattr(a, b + '_level') for a in self.rows]
+		self.table.age[:] = [a.age for a in self.rows]
+		levels = self.table.levels()
+		inc_inf = np.zeros((n, len(BEHAVIOUR_COLUMNS), 3))
+		for r, rel in enumerate(RELATIONSHIPS):
+			# influence weights for each receiving agent, indexed by its influence table and workplace type
+			wtype = self.table.workplace_type if rel == 'Workplace' else 0
+			w = self.weights[self.table.intervention, r, wtype]
+			inc_inf += self.relationship_counts(rel, levels) * w
+
+		# Calculate the new level for each living agent based on the calculated incoming influence.
+		# These are stored in the agents' temporary variables, to be swapped over by update_risk_levels.
+		alive = np.flatnonzero(self.table.alive)
+		threshold = self.table.threshold[alive]
+		temp = [next_levels(inc_inf[alive, b], threshold, levels[alive, b], self.rng, smoking = (name == 'smoking')).tolist() \
+			for b, name in enumerate(BEHAVIOUR_COLUMNS)]
+		for i, smoking, alcohol, diet, inactivity in zip(alive.tolist(), *temp):
+			agent = self.rows[i]
+			agent.smoking_level_temp = smoking
+			agent.alcohol_level_temp = alcohol
+			agent.diet_level_temp = diet
+			agent.inactivity_level_temp = inactivity
+		for b, name in enumerate(BEHAVIOUR_COLUMNS):
+			getattr(self.table, name)[alive] = temp[b]
+
+
+	# number of living agents at each behaviour level influencing each agent through a relationship,
+	# as an array of shape (agent, behaviour, level)
+	# spouses and friends are counted along the CSR layers; household and workplace members are the
+	# group totals minus the agent itself (for a workplace, minus its household members sharing the
+	# workplace) and minus the excluded pairs, which is linear in the population rather than in the
+	# sum of the squared group sizes
+	def relationship_counts(self, rel, levels):
+		if rel in self.layers:
+			return self.layer_counts(self.layers[rel], levels)
+		if rel == 'Household':
+			counts = self.group_counts(self.table.household, levels) - self.group_counts(np.arange(len(self.table)), levels)
+		else:
+			counts = self.group_counts(self.table.workplace, levels) - self.group_counts(self.joint, levels)
+		return counts - self.layer_counts(self.exclusions[rel], levels)
+
+
+	# number of living neighbours along a CSR layer at each behaviour level
+	def layer_counts(self, layer, levels):
+		n = len(self.table)
+		rows = layer.rows()
+		live = self.table.alive[layer.indices]
+		counts = np.empty((n, len(BEHAVIOUR_COLUMNS), 3))
+		for b in range(len(BEHAVIOUR_COLUMNS)):
+			onehot = rows * 3 + levels[layer.indices, b]
+			counts[:, b] = np.bincount(onehot, weights=live, minlength=3 * n).reshape(n, 3)
+		return counts
+
+
+	# number of living members of each agent's group at each behaviour level (zero for group -1)
+	def group_counts(self, group, levels):
+		n_groups = int(group.max()) + 1
+		# agents without a group are counted, with no weight, in an extra empty group
+		member = group >= 0
+		group = np.where(member, group, n_groups).astype(np.intp)
+		live = self.table.alive & member
+		counts = np.empty((len(self.table), len(BEHAVIOUR_COLUMNS), 3))
+		for b in range(len(BEHAVIOUR_COLUMNS)):
+			totals = np.bincount(group * 3 + levels[:, b], weights=live, minlength=3 * (n_groups + 1)).reshape(-1, 3)
+			counts[:, b] = totals[group]
+		return counts
+
+
+	# test every living agent for a CVD event using the updated levels, with one lookup in the
+	# annual CVD probability table and one bulk uniform draw (the batched equivalent of Agent.test_for_cv)
+	# with per-agent covariates the base risk is instead evaluated for the whole population in one call
+	def matrix_cvd_test(self):
+		alive = self.table.alive
+		if self.covariates is None:
+			p = parameters.cvd_probability(self.cvd_table, self.table.sex[alive], self.table.age[alive], self.table.levels()[alive])
+		else:
+			p = parameters.cvd_probability_with_covariates(self.cvd_multiplier, self.table.sex[alive], self.table.age[alive], \
+				self.table.levels()[alive], {name: value[alive] for name, value in self.covariates.items()})
+		self.cv_chance = np.zeros(len(self.table))
+		self.cv_chance[alive] = p * 10.0
+		self.cvd_event = np.zeros(len(self.table), dtype=bool)
+		self.cvd_event[alive] = self.rng.random(len(p)) < p
+
+
+	# test an agent for a CVD event, setting its (ten year) CVD chance
+	def test_for_cv(self, agent):
+		if self.engine == 'loop':
+			return agent.test_for_cv()
+		i = self.row[agent.id]
+		agent.cv_chance = self.cv_chance[i]
+		return self.cvd_event[i]
+
+
 def default_rels():
 	inf_by_rel = dict()
 	rKey = ['Spouse', 'Friendship', 'Household', 'Workplace']
@@ -817,6 +1035,9 @@ def main():
 
 	parser.add_argument('--metrics', dest='mets', action='store_true', help='store behaviour prevalence metrics')
 
+	parser.add_argument('--engine', choices=ENGINES, default='loop',
+			     help='engine used to compute incoming influence')
+
 	# parser.add_argument('--plots', dest='plots',
 	# 	action='store_true', help='generate basic plots')
 	# parser.set_defaults(plots=False)
@@ -844,7 +1065,7 @@ def main():
 	inf_by_rel = param.get_inf_by_rel()
 
 	# spreader = Spread_Model(agent_list, inf_by_rel, graph)
-	spreader = Spread_Model(agent_list, inf_by_rel, stats_base_filename)
+	spreader = Spread_Model(agent_list, inf_by_rel, stats_base_filename, engine=args.engine, cvd_table=param.cvd_table)
 
 	print("Beginning simulation.")
 
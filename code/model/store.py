@@ -0,0 +1,394 @@
+import os
+import gc
+import shutil
+import random
+import hashlib
+from pathlib import Path
+import numpy as np
+from agent import AgentTable
+from network import Network, CSR, RELATIONSHIPS, set_relationship_lists, locality_order, \
+    newman_watts_strogatz_shortcuts, newman_watts_strogatz_graph, barabasi_albert_edges
+import parameters
+
+# version of the snapshot file layout, part of the cache key so old snapshots are not reused
+SNAPSHOT_FORMAT = 2
+
+# source files of the code that generates a population, whose contents are part of the cache key so that a
+# change to the generation is never hidden by a population cached before it (see parameters.source_hash)
+SNAPSHOT_SOURCES = ['agent.py', 'network.py', 'parameters.py']
+
+# relationship list attribute of Agent for each layer stored in a snapshot (the spouse is not a list)
+RELATIONSHIP_LISTS = {'Household': 'household', 'Friendship': 'friends', 'Workplace': 'workplace'}
+
+
+# cache key for a population generated from a parameter folder with a target size and seed
+def snapshot_key(parameter_folder, target_size, seed, batch=False):
+    key = "|".join([parameters.parameter_hash(parameter_folder), parameters.source_hash(SNAPSHOT_SOURCES), str(target_size),
+                    str(seed), str(batch), str(SNAPSHOT_FORMAT)])
+    return hashlib.sha256(key.encode()).hexdigest()[:24]
+
+
+# save a generated population as a compressed .npz of the agent columns and CSR relationship layers,
+# along with the state of the random and numpy.random generators after generation
+def save_snapshot(path, agent_list):
+    table = AgentTable.from_agents(agent_list)
+    layers = Network.relationship_layers(agent_list)
+    arrays = {name: getattr(table, name) for name in AgentTable.COLUMNS}
+    for rel in RELATIONSHIPS:
+        arrays[rel + '_offsets'] = layers[rel].offsets
+        arrays[rel + '_indices'] = layers[rel].indices
+    version, state, gauss_next = random.getstate()
+    arrays['random_state'] = np.array(state, dtype=np.int64)
+    arrays['random_version'] = np.array(version)
+    arrays['random_gauss_next'] = np.array(np.nan if gauss_next is None else gauss_next)
+    _, keys, pos, has_gauss, cached_gaussian = np.random.get_state()
+    arrays['numpy_state'] = keys
+    arrays['numpy_state_pos'] = np.array([pos, has_gauss])
+    arrays['numpy_state_gauss'] = np.array(cached_gaussian)
+    # write to a temporary file first, so an interrupted save never leaves a partial snapshot
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temp = path.with_name(path.stem + '.tmp.npz')
+    np.savez_compressed(temp, **arrays)
+    os.replace(temp, path)
+
+
+# load a population saved by save_snapshot, recreating the agents and their relationships
+# the random generators are left in the state they were in after the population was generated, so
+# a simulation run on the loaded population is the same as one run straight after generation
+def load_snapshot(path, param):
+    # garbage collection is paused while the agents and their lists are allocated (see set_relationship_lists)
+    collecting = gc.isenabled()
+    gc.disable()
+    try:
+        return read_snapshot(path, param)
+    finally:
+        if collecting:
+            gc.enable()
+
+
+# create the agents, their relationships and the generator states from the arrays of a snapshot
+def read_snapshot(path, param):
+    with np.load(path) as data:
+        table = AgentTable(0)
+        for name in AgentTable.COLUMNS:
+            setattr(table, name, data[name])
+        agent_list = table.to_agents({s: param.pick_risk_factors(s) for s in parameters.SEXES})
+        spouse = CSR(data['Spouse_offsets'], data['Spouse_indices'])
+        for i, j in zip(np.flatnonzero(spouse.degree()).tolist(), spouse.indices.tolist()):
+            agent_list[i].spouse = agent_list[j]
+        for rel, attr in RELATIONSHIP_LISTS.items():
+            layer = CSR(data[rel + '_offsets'], data[rel + '_indices'])
+            set_relationship_lists(agent_list, layer.rows(), layer.indices, attr)
+        for a in agent_list:
+            if a.workplace_id is not None:
+                a.assign_to_workplace = False
+        gauss_next = float(data['random_gauss_next'])
+        random.setstate((int(data['random_version']), tuple(data['random_state'].tolist()), \
+            None if np.isnan(gauss_next) else gauss_next))
+        pos, has_gauss = data['numpy_state_pos'].tolist()
+        np.random.set_state(('MT19937', data['numpy_state'], pos, has_gauss, float(data['numpy_state_gauss'])))
+    return agent_list
+
+
+# seed the random generators and generate a population, or load it from the snapshot cache in
+# snapshot_folder if it has been generated before from the same parameters, target size and seed
+def cached_agents(param, target_size, seed, snapshot_folder='snapshots', batch=False):
+    path = Path(snapshot_folder, snapshot_key(param.parameter_folder, target_size, seed, batch) + '.npz')
+    if path.exists():
+        print("Loading population snapshot:", path)
+        return load_snapshot(path, param)
+    random.seed(seed)
+    np.random.seed(seed)
+    agent_list = Network(param).generate_agents(target_size, batch=batch)
+    save_snapshot(path, agent_list)
+    return agent_list
+
+
+## Memory-mapped population store ##
+
+# relationship layers kept in a store; household and workplace influence is computed from the group id
+# columns (see spread.Spread_Model.relationship_counts), so their cliques are not stored
+STORE_LAYERS = ['Spouse', 'Friendship']
+
+
+# write a population to a store: a folder holding one .npy file per AgentTable column and per CSR array
+# of the STORE_LAYERS, which open_store maps back without reading them into memory
+def write_store(folder, table, layers):
+    save_arrays(folder, {name: getattr(table, name) for name in AgentTable.COLUMNS})
+    save_layers(folder, layers)
+
+
+# save the CSR arrays of the STORE_LAYERS to a store
+def save_layers(folder, layers):
+    arrays = dict()
+    for rel in STORE_LAYERS:
+        arrays[rel + '_offsets'] = layers[rel].offsets
+        arrays[rel + '_indices'] = layers[rel].indices
+    save_arrays(folder, arrays)
+
+
+# save each array to a .npy file of the store named after its key
+def save_arrays(folder, arrays):
+    folder = Path(folder)
+    folder.mkdir(parents=True, exist_ok=True)
+    for name, array in arrays.items():
+        # replace (rather than overwrite) existing files, which may still be mapped by an earlier model
+        path = folder / (name + '.npy')
+        path.unlink(missing_ok=True)
+        np.save(path, array)
+
+
+# write a generated population (a list of agents) to a store
+def store_agents(folder, agent_list):
+    write_store(folder, AgentTable.from_agents(agent_list), Network.relationship_layers(agent_list, STORE_LAYERS))
+
+
+# map a store written by write_store, returning its AgentTable and dict of CSR layers
+# the arrays are numpy memmaps, so pages are read from disk as they are accessed; with mode 'r+' changes
+# to the columns are written back to the files (the layers are always opened read-only); with layers=False
+# only the columns are mapped (e.g. while a store is being written)
+def open_store(folder, mode='r+', layers=True):
+    folder = Path(folder)
+    table = AgentTable(0)
+    for name in AgentTable.COLUMNS:
+        setattr(table, name, np.load(folder / (name + '.npy'), mmap_mode=mode))
+    if not layers:
+        return table, None
+    layers = dict()
+    for rel in STORE_LAYERS:
+        layers[rel] = CSR(np.load(folder / (rel + '_offsets.npy'), mmap_mode='r'), \
+            np.load(folder / (rel + '_indices.npy'), mmap_mode='r'))
+    return table, layers
+
+
+# write any changes to the columns of a mapped table back to its store
+def flush_store(table):
+    for name in AgentTable.COLUMNS:
+        column = getattr(table, name)
+        if isinstance(column, np.memmap):
+            column.flush()
+
+
+# number of households synthesised at a time by generate_store
+HOUSEHOLD_CHUNK = 1 << 18
+
+
+# write the columns of a store a chunk of rows at a time, for populations too large to build in memory
+# the rows are appended to raw files, which finish turns into the .npy files of write_store
+# table optionally gives the rows of an existing (e.g. mapped) table to start from, for growing a store
+# households appended by append_households are numbered on from the existing ones, and their spouse pairs
+# and employed agents (rows) recorded for wiring once the store is finished
+class StoreWriter:
+    def __init__(self, folder, table=None, chunk_size=1 << 22) -> None:
+        self.folder = Path(folder)
+        self.folder.mkdir(parents=True, exist_ok=True)
+        self.files = {name: open(self.folder / (name + '.raw'), 'wb') for name in AgentTable.COLUMNS}
+        self.n = 0
+        self.n_households = 0
+        self.spouse_rows, self.spouse_cols, self.employed = [], [], []
+        if table is not None and len(table) > 0:
+            for lo in range(0, len(table), chunk_size):
+                for name, file in self.files.items():
+                    np.asarray(getattr(table, name)[lo:lo + chunk_size]).tofile(file)
+            self.n = len(table)
+            self.n_households = int(table.household.max()) + 1
+
+    # append the rows of an AgentTable
+    def append(self, table):
+        for name, file in self.files.items():
+            getattr(table, name).tofile(file)
+        self.n += len(table)
+
+    # append households laid out by Network.layout_households, drawing the agents' thresholds from rng
+    def append_households(self, columns, rng):
+        table = AgentTable.from_columns(columns)
+        table.id += self.n
+        table.household += self.n_households
+        # thresholds are drawn as in Agent.__init__
+        table.threshold[:] = rng.normal(0.8, 0.05, len(table))
+        married = np.flatnonzero(columns['spouse'] >= 0)
+        self.spouse_rows.append(self.n + married)
+        self.spouse_cols.append(self.n + columns['spouse'][married])
+        self.employed.append(self.n + np.flatnonzero(columns['employed']))
+        self.append(table)
+        self.n_households += int(columns['household'][-1]) + 1
+
+    # synthesise and append households chunk_size at a time until there are target_size agents
+    def synthesise(self, network, target_size, rng, chunk_size=HOUSEHOLD_CHUNK):
+        while self.n < target_size:
+            n_draw = min(chunk_size, max(1000, (target_size - self.n) // 2))
+            hh = network.draw_household_block(n_draw, rng)
+            # keep households up to and including the one that reaches the target size
+            n_keep = min(n_draw, int(np.searchsorted(self.n + np.cumsum(hh['size']), target_size)) + 1)
+            self.append_households(network.layout_households({key: value[:n_keep] for key, value in hh.items()}, rng), rng)
+
+    # convert the raw files to .npy files (copying a chunk at a time) and return the mapped table
+    def finish(self, chunk_size=1 << 22):
+        for name, dtype in AgentTable.COLUMNS.items():
+            self.files[name].close()
+            raw = self.folder / (name + '.raw')
+            path = self.folder / (name + '.npy')
+            path.unlink(missing_ok=True)
+            column = np.lib.format.open_memmap(path, mode='w+', dtype=dtype, shape=(self.n,))
+            if self.n > 0:
+                source = np.memmap(raw, mode='r', dtype=dtype, shape=(self.n,))
+                for lo in range(0, self.n, chunk_size):
+                    column[lo:lo + chunk_size] = source[lo:lo + chunk_size]
+                del source
+            column.flush()
+            del column
+            raw.unlink()
+        table, _ = open_store(self.folder, layers=False)
+        return table
+
+
+# generate a population straight into a store, without creating Agent objects
+# households are synthesised HOUSEHOLD_CHUNK at a time (as in batch mode, see Network.synthesise_households)
+# and appended to the store, then workplaces and friendships are wired in a second pass over the stored
+# columns; memory is bounded by the chunk plus the final arrays (the employed rows, the friendship edges
+# and the spouse and friendship layers)
+# rng is the numpy Generator used for every draw (seeded from the random module if not given); with shards
+# the households are instead synthesised as that many shards on a pool of processes, chunk_size agents at
+# a time appended as they arrive, and every draw comes from streams spawned from seed (see
+# Network.sharded_households), so the store depends only on the seed, the number of shards and chunk_size
+def generate_store(param, folder, target_size, rng=None, chunk_size=HOUSEHOLD_CHUNK, shards=None, seed=None, processes=None):
+    network = Network(param)
+    if shards is not None:
+        seeds = np.random.SeedSequence(seed).spawn(shards + 1)
+        rng = np.random.default_rng(seeds[-1])
+    elif rng is None:
+        rng = np.random.default_rng(random.getrandbits(64))
+    writer = StoreWriter(folder)
+    if shards is not None:
+        for columns in network.sharded_households(target_size, seeds[:-1], processes, chunk_size):
+            writer.append_households(columns, rng)
+    writer.synthesise(network, target_size, rng, chunk_size)
+    print("Created agents and households. Target size: ", target_size, " actual size: ", writer.n)
+    table = writer.finish()
+
+    wire_workplaces(network, table, np.concatenate(writer.employed), rng)
+    # both spouses of a couple are listed in spouse_rows, so the spouse layer needs no reversed edges
+    spouse = CSR.from_edges(np.concatenate(writer.spouse_rows), np.concatenate(writer.spouse_cols), writer.n)
+    save_layers(folder, {'Spouse': spouse, 'Friendship': wire_friendships(param, folder, table, rng)})
+    flush_store(table)
+    return table
+
+
+# extend a generated store to target_size agents, so that a sweep over population sizes can grow one
+# population rather than generate each size from scratch; the store must not have been simulated
+# (run the simulation on a copy, see copy_store)
+# the further households are synthesised as in generate_store and their employed agents carved into new
+# workplaces (workplaces are random samples of the employed, which the new agents are too), and the
+# friendship graph is grown over further nodes for the new agents (see wire_friendships), so each agent's
+# household, workplace and friendships follow the same distributions as in a store generated at the
+# larger size
+# rng, shards and seed are as in generate_store; without shards, seed (if given) seeds the Generator, so a
+# store grown from a seeded store is determined by the two seeds
+def grow_store(param, folder, target_size, rng=None, chunk_size=HOUSEHOLD_CHUNK, shards=None, seed=None, processes=None):
+    network = Network(param)
+    if shards is not None:
+        seeds = np.random.SeedSequence(seed).spawn(shards + 1)
+        rng = np.random.default_rng(seeds[-1])
+    elif seed is not None:
+        rng = np.random.default_rng(np.random.SeedSequence(seed))
+    elif rng is None:
+        rng = np.random.default_rng(random.getrandbits(64))
+    table, layers = open_store(folder, mode='r')
+    if target_size <= len(table):
+        print("Error: cannot grow a store of", len(table), "agents to", target_size)
+        exit(1)
+    n_old = len(table)
+    spouse = layers['Spouse']
+    spouse_rows, spouse_cols = [spouse.rows()], [np.asarray(spouse.indices)]
+    writer = StoreWriter(folder, table)
+    if shards is not None:
+        for columns in network.sharded_households(target_size - n_old, seeds[:-1], processes, chunk_size):
+            writer.append_households(columns, rng)
+    writer.synthesise(network, target_size, rng, chunk_size)
+    print("Grew agents and households. Target size: ", target_size, " actual size: ", writer.n)
+    table = writer.finish()
+
+    wire_workplaces(network, table, np.concatenate(writer.employed), rng)
+    spouse = CSR.from_edges(np.concatenate(spouse_rows + writer.spouse_rows), np.concatenate(spouse_cols + writer.spouse_cols), writer.n)
+    save_layers(folder, {'Spouse': spouse, 'Friendship': wire_friendships(param, folder, table, rng, n_old)})
+    flush_store(table)
+    return table
+
+
+# copy a store (e.g. a generated population to run a simulation on, which changes its columns)
+def copy_store(source, folder):
+    folder = Path(folder)
+    folder.mkdir(parents=True, exist_ok=True)
+    for path in Path(source).glob('*.npy'):
+        # replace (rather than overwrite) existing files, which may still be mapped by an earlier model
+        (folder / path.name).unlink(missing_ok=True)
+        shutil.copyfile(path, folder / path.name)
+
+
+# reorder the rows of a store for cache locality (see network.locality_order and Network.reorder), so that
+# the chunked model reads each chunk's neighbours and group totals from nearby rows; returns the permutation
+# (new row i held old row order[i]), which the id column also records
+# the columns are reordered in memory and the saved friendship graph (if any) is renumbered, so the store
+# can still be grown
+def reorder_store(folder, ordering='rcm'):
+    table, layers = open_store(folder, mode='r')
+    order = locality_order(np.asarray(table.household), layers['Friendship'], ordering)
+    table, layers = Network.reorder(table, layers, order)
+    write_store(folder, table, layers)
+    nodes = Path(folder, 'Graph_nodes.npy')
+    if nodes.exists():
+        inverse = np.empty(len(order), dtype=np.int32)
+        inverse[order] = np.arange(len(order), dtype=np.int32)
+        save_arrays(folder, {'Graph_nodes': inverse[np.load(nodes)]})
+    return order
+
+
+# carve the shuffled employed agents (rows of table) into consecutive new workplaces (see
+# Network.assign_workplaces), numbered on from the workplaces already in the table
+def wire_workplaces(network, table, employed, rng):
+    pool = rng.permutation(employed)
+    sizes, types = [], []
+    total = 0
+    while total < len(pool):
+        contacts, wtype = network.draw_workplaces(max(1000, (len(pool) - total) // 10), rng)
+        sizes.append(contacts + 1)
+        types.append(wtype)
+        total += sizes[-1].sum()
+    ends = np.cumsum(np.concatenate(sizes))
+    workplace = np.searchsorted(ends, np.arange(len(pool)), side='right').astype(np.int32)
+    table.workplace[pool] = int(table.workplace.max()) + 1 + workplace
+    table.workplace_type[pool] = np.concatenate(types)[workplace]
+
+
+# draw the friendship graph of a store and return its friendship layer: friendships between agents in
+# different households (see Network.generate_agents)
+# the graph is saved in the store (as the Graph_* arrays) so that grow=True can extend it to a grown
+# population: the agent row of each graph node, and the edges drawn by the generator, which are the
+# shortcuts of a Newman-Watts-Strogatz graph (whose ring follows from the number of nodes) or every edge
+# of a Barabasi-Albert graph
+# n_old is the number of agents the saved graph was drawn for (0 to draw a new graph); the further graph
+# nodes are a sample of the agents added since, in the same proportion (1 - graph_excluded) as the first
+def wire_friendships(param, folder, table, rng, n_old=0):
+    n = len(table)
+    friendNetworkSize = int(n * (1.0 - param.graph_excluded))
+    nodes, source, target = np.zeros(0, dtype=np.int32), None, None
+    if n_old > 0:
+        nodes, source, target = [np.load(Path(folder, 'Graph_' + name + '.npy')) for name in ['nodes', 'source', 'target']]
+    added = rng.choice(np.arange(n_old, n, dtype=np.int32), friendNetworkSize - len(nodes), replace=False)
+    nodes = np.concatenate([nodes, added]).astype(np.int32)
+    if param.graph_type == 'Newman–Watts–Strogatz':
+        source, target = newman_watts_strogatz_shortcuts(friendNetworkSize, param.graph_k, param.graph_p, rng, \
+            n_old=len(nodes) - len(added), su=source, sv=target)
+        u, v = newman_watts_strogatz_graph(friendNetworkSize, param.graph_k, source, target)
+    elif param.graph_type == 'Barabasi-Albert':
+        u, v = source, target = barabasi_albert_edges(friendNetworkSize, param.graph_m, rng, known=target)
+    else:
+        print("Error: unknown graph type " + param.graph_type)
+        exit(1)
+    save_arrays(folder, {'Graph_nodes': nodes, 'Graph_source': source, 'Graph_target': target})
+    u, v = nodes[u], nodes[v]
+    distinct = table.household[u] != table.household[v]
+    u, v = u[distinct], v[distinct]
+    print("Created friendship network with", friendNetworkSize, "nodes and", len(u), "edges")
+    return CSR.from_edges(np.concatenate([u, v]), np.concatenate([v, u]), n)